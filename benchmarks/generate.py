@@ -0,0 +1,132 @@
+import argparse
+import calendar
+import csv
+import itertools
+import os
+import random
+
+from execution.data_loader import COLUMNS, YEAR_TABLES
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(BENCH_DIR, "data", "sales_orders")
+
+# Relative weights; each dimension is skewed the way real order books are.
+PRODUCT_WEIGHTS = {
+    "iphone": 34,
+    "samsung": 26,
+    "xiaomi": 18,
+    "pixel": 13,
+    "oneplus": 9,
+}
+PRODUCT_PRICES = {
+    "iphone": 1100,
+    "samsung": 900,
+    "pixel": 800,
+    "oneplus": 650,
+    "xiaomi": 450,
+}
+REGION_WEIGHTS = {
+    "north_america": 38,
+    "europe": 29,
+    "asia": 24,
+    "south_america": 9,
+}
+CHANNEL_WEIGHTS = {"online": 55, "retail": 30, "partner": 15}
+# Orders grow year over year and peak in the holiday quarter.
+YEAR_WEIGHTS = [1.0, 1.25, 1.5, 1.8]
+MONTH_WEIGHTS = [7, 6, 7, 7, 8, 8, 8, 8, 9, 10, 12, 14]
+CUSTOMER_SKEW = 1.1
+BATCH_SIZE = 50000
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def _customer_weights(customers):
+    # Zipf: a few accounts place a large share of the orders.
+    return _cumulative(
+        1.0 / (rank**CUSTOMER_SKEW) for rank in range(1, customers + 1)
+    )
+
+
+def _split_rows(rows, years):
+    weights = YEAR_WEIGHTS[-len(years):]
+    total = sum(weights)
+    counts = [int(rows * weight / total) for weight in weights]
+    counts[-1] += rows - sum(counts)
+    return dict(zip(years, counts))
+
+
+def _draw(rng, weights, size):
+    return rng.choices(
+        list(weights), cum_weights=_cumulative(weights.values()), k=size
+    )
+
+
+def _batch(rng, year, size, start_id, customer_ids, customer_cum):
+    products = _draw(rng, PRODUCT_WEIGHTS, size)
+    regions = _draw(rng, REGION_WEIGHTS, size)
+    channels = _draw(rng, CHANNEL_WEIGHTS, size)
+    customers = rng.choices(customer_ids, cum_weights=customer_cum, k=size)
+    months = rng.choices(range(1, 13), cum_weights=_cumulative(MONTH_WEIGHTS), k=size)
+
+    for offset in range(size):
+        product = products[offset]
+        month = months[offset]
+        day = rng.randint(1, calendar.monthrange(year, month)[1])
+        # Most orders are a single unit; a long tail buys in bulk.
+        quantity = int(rng.paretovariate(2.5))
+        revenue = round(PRODUCT_PRICES[product] * quantity * rng.uniform(0.7, 1.3))
+        yield [
+            start_id + offset,
+            customers[offset],
+            product,
+            regions[offset],
+            channels[offset],
+            f"{year:04d}-{month:02d}-{day:02d}",
+            year,
+            revenue,
+        ]
+
+
+def generate(rows, output_dir=OUTPUT_DIR, seed=7, customers=5000):
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    width = max(3, len(str(customers)))
+    customer_ids = [f"CUST{number:0{width}d}" for number in range(1, customers + 1)]
+    customer_cum = _customer_weights(customers)
+
+    years = sorted(YEAR_TABLES)
+    next_id = 1
+    paths = []
+    for year, count in _split_rows(rows, years).items():
+        path = os.path.join(output_dir, f"year={year}.csv")
+        with open(path, "w", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(COLUMNS)
+            remaining = count
+            while remaining:
+                size = min(BATCH_SIZE, remaining)
+                writer.writerows(
+                    _batch(rng, int(year), size, next_id, customer_ids, customer_cum)
+                )
+                next_id += size
+                remaining -= size
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write seeded synthetic sales orders in the year=YYYY.csv layout."
+    )
+    parser.add_argument("--rows", type=int, default=1_000_000, help="total rows")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="directory to write")
+    parser.add_argument("--seed", type=int, default=7, help="random seed")
+    parser.add_argument(
+        "--customers", type=int, default=5000, help="distinct customer ids"
+    )
+    args = parser.parse_args()
+    for path in generate(args.rows, args.output, args.seed, args.customers):
+        print(f"Wrote {path}")
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import httpx
+
+from .run import QUESTIONS_PATH, _percentile, _write_json, load_questions
+
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+LAG_INTERVAL = 0.01
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = {}
+
+    def add(self, latency, status=None, error=None):
+        if error is not None:
+            name = type(error).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == 200:
+            self.latencies.append(latency)
+
+
+def parse_mix(text):
+    # "READ=4,LIST=1" weights the corpus by intent; intents left out are
+    # not sent.
+    weights = {}
+    for part in text.split(","):
+        intent, _, weight = part.partition("=")
+        weights[intent.strip().upper()] = float(weight or 1)
+    return weights
+
+
+def _question_picker(questions, mix, seed):
+    rng = random.Random(seed)
+    if mix:
+        questions = [item for item in questions if item[0] in mix]
+        weights = [mix[intent] for intent, _ in questions]
+    else:
+        weights = [1] * len(questions)
+    if not questions:
+        raise ValueError("The question mix selects no questions")
+    texts = [question for _, question in questions]
+    return lambda: rng.choices(texts, weights=weights)[0]
+
+
+async def _send(client, recorder, question, show_tree, scheduled):
+    # Latency runs from when the request was due, not when it was sent, so a
+    # stalled client does not hide server queueing.
+    try:
+        response = await client.post(
+            "/ask", json={"question": question, "show_tree": show_tree}
+        )
+    except httpx.HTTPError as error:
+        recorder.add(None, error=error)
+        return
+    recorder.add(time.perf_counter() - scheduled, status=response.status_code)
+
+
+async def _closed_loop(client, recorder, pick, concurrency, deadline, show_tree):
+    async def user():
+        while time.perf_counter() < deadline:
+            await _send(client, recorder, pick(), show_tree, time.perf_counter())
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def _open_loop(client, recorder, pick, rate, deadline, show_tree, seed):
+    # Poisson arrivals: requests are fired on schedule whether or not earlier
+    # ones have finished.
+    rng = random.Random(seed)
+    pending = set()
+    scheduled = time.perf_counter()
+    while scheduled < deadline:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(
+            _send(client, recorder, pick(), show_tree, scheduled)
+        )
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        scheduled += rng.expovariate(rate)
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def _watch_loop(lags, stop):
+    # Any time the loop spends past the sleep interval is time it was blocked.
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - start - LAG_INTERVAL))
+
+
+def _client(url, timeout):
+    if url:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        return httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits)
+    import web_app
+
+    # App errors come back as 500s instead of being raised into the client.
+    transport = httpx.ASGITransport(app=web_app.app, raise_app_exceptions=False)
+    return httpx.AsyncClient(
+        transport=transport, base_url="http://loadtest", timeout=timeout
+    )
+
+
+async def _drive(args, pick):
+    recorder = Recorder()
+    lags = []
+    stop = asyncio.Event()
+
+    async with _client(args.url, args.timeout) as client:
+        watcher = asyncio.ensure_future(_watch_loop(lags, stop))
+        start = time.perf_counter()
+        deadline = start + args.duration
+        if args.rate:
+            await _open_loop(
+                client, recorder, pick, args.rate, deadline, args.show_tree, args.seed
+            )
+        else:
+            await _closed_loop(
+                client, recorder, pick, args.concurrency, deadline, args.show_tree
+            )
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await watcher
+    return recorder, lags, elapsed
+
+
+async def _run(args, pick):
+    if args.url:
+        return await _drive(args, pick)
+    # In-process runs go through the app's own startup and shutdown, so the
+    # bootstrap, warm-up and worker pool match a real server.
+    import web_app
+
+    async with web_app.lifespan(web_app.app):
+        return await _drive(args, pick)
+
+
+def _summary(values, percentiles):
+    if not values:
+        return None
+    summary = {f"p{percent}": _percentile(values, percent) for percent in percentiles}
+    summary["max"] = max(values)
+    return summary
+
+
+def summarize(args, recorder, lags, elapsed):
+    total = sum(recorder.statuses.values()) + sum(recorder.errors.values())
+    ok = recorder.statuses.get(200, 0)
+    return {
+        "meta": {
+            "target": args.url or "in-process",
+            "mode": f"open loop at {args.rate}/s" if args.rate else "closed loop",
+            "concurrency": None if args.rate else args.concurrency,
+            "duration": args.duration,
+            "show_tree": args.show_tree,
+            "mix": args.mix,
+        },
+        "requests": total,
+        "throughput_rps": ok / elapsed if elapsed else 0.0,
+        "error_rate": (total - ok) / total if total else 0.0,
+        "statuses": {
+            str(status): count for status, count in recorder.statuses.items()
+        },
+        "errors": recorder.errors,
+        "latency_seconds": _summary(recorder.latencies, LATENCY_PERCENTILES),
+        "loop_lag_seconds": _summary(lags, [50, 99]),
+    }
+
+
+def report(summary):
+    meta = summary["meta"]
+    concurrency = f", {meta['concurrency']} users" if meta["concurrency"] else ""
+    print(f"{meta['target']}, {meta['mode']}{concurrency}, {meta['duration']}s")
+    print(
+        f"requests {summary['requests']}, {summary['throughput_rps']:.1f} ok/s, "
+        f"error rate {summary['error_rate']:.2%}"
+    )
+    print(f"statuses {summary['statuses']} errors {summary['errors']}")
+    latency = summary["latency_seconds"]
+    if latency:
+        print(
+            "latency ms  "
+            + "  ".join(f"{key} {value * 1000:.1f}" for key, value in latency.items())
+        )
+    lag = summary["loop_lag_seconds"]
+    if lag:
+        print(
+            "loop lag ms "
+            + "  ".join(f"{key} {value * 1000:.1f}" for key, value in lag.items())
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the /ask endpoint.")
+    parser.add_argument(
+        "--url",
+        help="server to target, e.g. http://127.0.0.1:8000 (default: in-process)",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="closed-loop users"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="open-loop arrivals per second (overrides --concurrency)",
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--mix", help="intent weights, e.g. READ=4,AGG_MAX=2,LIST=1")
+    parser.add_argument("--show-tree", action="store_true", help="request parse trees")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the summary as JSON")
+    parser.add_argument("--data-dir", help="SALES_DATA_DIR for in-process runs")
+    parser.add_argument("--db", help="SALES_DB_PATH for in-process runs")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        os.environ["SALES_DATA_DIR"] = os.path.abspath(args.data_dir)
+    if args.db:
+        os.environ["SALES_DB_PATH"] = os.path.abspath(args.db)
+    pick = _question_picker(
+        load_questions(args.questions),
+        parse_mix(args.mix) if args.mix else None,
+        args.seed,
+    )
+    recorder, lags, elapsed = asyncio.run(_run(args, pick))
+    summary = summarize(args, recorder, lags, elapsed)
+    report(summary)
+    if args.output:
+        _write_json(args.output, summary)
+        print(f"Saved {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
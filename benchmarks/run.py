@@ -0,0 +1,243 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, "data", "sales_orders")
+DB_PATH = os.path.join(BENCH_DIR, "data", "sales_orders.db")
+QUESTIONS_PATH = os.path.join(BENCH_DIR, "questions.json")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "latest.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+PERCENTILES = [50, 95, 99]
+# p99 over a few hundred samples is mostly scheduler noise, so it is reported
+# but only p50 and p95 are held to the baseline.
+GATED_PERCENTILES = ["p50", "p95"]
+# Stages this fast jitter by more than any real change; they are not gated.
+MIN_GATED_SECONDS = 0.0005
+DEFAULT_TOLERANCE = 0.25
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _summary(values):
+    summary = {f"p{percent}": _percentile(values, percent) for percent in PERCENTILES}
+    summary["count"] = len(values)
+    return summary
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return peak * scale / (1024 * 1024)
+
+
+def load_questions(path=QUESTIONS_PATH):
+    with open(path) as handle:
+        corpus = json.load(handle)
+    return [
+        (intent, question) for intent, items in corpus.items() for question in items
+    ]
+
+
+def run(questions, iterations=5, warm_caches=False, warmup=1, limit=None):
+    # Imported here so main() can point SALES_DATA_DIR / SALES_DB_PATH at the
+    # generated data first.
+    import engine
+    from execution.data_loader import ensure_bootstrapped, partition_stats
+    from execution.executor import result_cache
+    from web_app import ASK_PAGE_SIZE
+
+    # Listings are paged the way /ask pages them rather than materialized whole.
+    limit = limit or ASK_PAGE_SIZE
+
+    start = time.perf_counter()
+    ensure_bootstrapped()
+    bootstrap_seconds = time.perf_counter() - start
+    engine.warm_up()
+    # Unmeasured passes load lazily built state (tokenizers, indexes, page
+    # cache) so the first measured question is not charged for it.
+    for _ in range(warmup):
+        for _, question in questions:
+            engine.analyze(question, limit=limit)
+
+    stages = {}
+    mismatches = {}
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for intent, question in questions:
+            if not warm_caches:
+                engine.plan_cache.clear()
+                result_cache.clear()
+            analysis = engine.analyze(question, limit=limit, debug=True)
+            for name, seconds in analysis["metrics"]["stages"].items():
+                stages.setdefault(name, []).append(seconds)
+            if analysis["intent"] != intent:
+                mismatches[question] = analysis["intent"]
+    elapsed = time.perf_counter() - start
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": os.environ.get("EXECUTION_BACKEND", "sql"),
+            "rows": sum(stats["rows"] for stats in partition_stats().values()),
+            "questions": len(questions),
+            "iterations": iterations,
+            "warmup": warmup,
+            "warm_caches": warm_caches,
+            "limit": limit,
+        },
+        "bootstrap_seconds": bootstrap_seconds,
+        "throughput_qps": len(questions) * iterations / elapsed,
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": {name: _summary(values) for name, values in sorted(stages.items())},
+        "intent_mismatches": mismatches,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for key in ["rows", "backend", "warm_caches", "limit"]:
+        if results["meta"].get(key) != baseline["meta"].get(key):
+            regressions.append(
+                f"{key} differs from the baseline "
+                f"({results['meta'].get(key)} vs {baseline['meta'].get(key)}); "
+                "regenerate the data or the baseline"
+            )
+    if regressions:
+        return regressions
+
+    for name, base in baseline["stages"].items():
+        current = results["stages"].get(name)
+        if current is None:
+            continue
+        for percentile in GATED_PERCENTILES:
+            if base[percentile] < MIN_GATED_SECONDS:
+                continue
+            limit = base[percentile] * (1 + tolerance)
+            if current[percentile] > limit:
+                regressions.append(
+                    f"{name} {percentile} {current[percentile] * 1000:.2f} ms "
+                    f"> {limit * 1000:.2f} ms "
+                    f"(baseline {base[percentile] * 1000:.2f} ms)"
+                )
+
+    floor = baseline["throughput_qps"] * (1 - tolerance)
+    if results["throughput_qps"] < floor:
+        regressions.append(
+            f"throughput {results['throughput_qps']:.1f} q/s < {floor:.1f} q/s "
+            f"(baseline {baseline['throughput_qps']:.1f} q/s)"
+        )
+    if results["peak_rss_mb"] and baseline.get("peak_rss_mb"):
+        ceiling = baseline["peak_rss_mb"] * (1 + tolerance)
+        if results["peak_rss_mb"] > ceiling:
+            regressions.append(
+                f"peak RSS {results['peak_rss_mb']:.0f} MB > {ceiling:.0f} MB "
+                f"(baseline {baseline['peak_rss_mb']:.0f} MB)"
+            )
+    return regressions
+
+
+def report(results):
+    meta = results["meta"]
+    print(
+        f"{meta['rows']} rows, {meta['questions']} questions x "
+        f"{meta['iterations']} iterations, backend {meta['backend']}"
+    )
+    print(f"{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'count':>8}")
+    for name, summary in results["stages"].items():
+        print(
+            f"{name:<12}{summary['p50'] * 1000:>10.2f}{summary['p95'] * 1000:>10.2f}"
+            f"{summary['p99'] * 1000:>10.2f}{summary['count']:>8}"
+        )
+    print(f"throughput  {results['throughput_qps']:.1f} questions/s")
+    if results["peak_rss_mb"] is not None:
+        print(f"peak RSS    {results['peak_rss_mb']:.0f} MB")
+    for question, intent in results["intent_mismatches"].items():
+        print(f"intent mismatch: {question!r} resolved to {intent}")
+
+
+def _write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as handle:
+        json.dump(payload, handle, indent=2)
+        handle.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark engine.analyze.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="year=YYYY.csv sources")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite file built from them")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured passes")
+    parser.add_argument(
+        "--limit", type=int, help="rows per LIST answer (default: ASK_PAGE_SIZE)"
+    )
+    parser.add_argument(
+        "--warm-caches",
+        action="store_true",
+        help="keep plan and result caches between questions",
+    )
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store these results as the new baseline instead of comparing",
+    )
+    args = parser.parse_args(argv)
+
+    os.environ["SALES_DATA_DIR"] = os.path.abspath(args.data_dir)
+    os.environ["SALES_DB_PATH"] = os.path.abspath(args.db)
+    results = run(
+        load_questions(args.questions),
+        args.iterations,
+        warm_caches=args.warm_caches,
+        warmup=args.warmup,
+        limit=args.limit,
+    )
+    report(results)
+    _write_json(args.output, results)
+    print(f"Saved {args.output}")
+
+    if args.save_baseline:
+        _write_json(args.baseline, results)
+        print(f"Saved baseline {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; rerun with --save-baseline to set one")
+        return 0
+    with open(args.baseline) as handle:
+        regressions = compare(results, json.load(handle), args.tolerance)
+    if regressions:
+        print(f"\nREGRESSION against {args.baseline}:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
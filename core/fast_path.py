@@ -0,0 +1,101 @@
+import os
+
+from .lexicon import load_terms
+from .parser import tokenize
+from .planner import plan
+from .tree_walker import (
+    AGGREGATE_TOKENS,
+    MONTH_MAP,
+    _add_filter,
+    _infer_filter_from_value,
+)
+
+# Questions shaped like "show [me] [the] [total] revenue [in <filter>]..." are
+# planned straight from tokens; anything else goes through the full parse.
+ENABLED = os.environ.get("PARSER_FAST_PATH", "") == "1"
+
+LEAD_TOKENS = [["show", "me"], ["show"], ["give", "me"]]
+FILLER_TOKENS = {"the"}
+REVENUE_TOKENS = {
+    word
+    for word, metric in load_terms().items()
+    if metric == "revenue" and " " not in word
+}
+TRAILING_PUNCT = {"?", ".", "!"}
+
+
+def _is_year(word):
+    return word.isdigit() and len(word) == 4
+
+
+def _split_segments(words):
+    segments = []
+    for word in words:
+        if word == "in":
+            segments.append([])
+        elif not segments:
+            return None
+        else:
+            segments[-1].append(word)
+    if any(not segment for segment in segments):
+        return None
+    return segments
+
+
+def _apply_segment(segment, filters, months):
+    if segment[0] in MONTH_MAP:
+        months.append(MONTH_MAP[segment[0]])
+        rest = segment[1:]
+        if not rest:
+            return True
+        if len(rest) == 1 and _is_year(rest[0]):
+            _add_filter(filters, "year", rest[0])
+            return True
+        return False
+
+    if all(_is_year(word) for word in segment[::2]) and all(
+        word == "and" for word in segment[1::2]
+    ):
+        for year in segment[::2]:
+            _add_filter(filters, "year", year)
+        return True
+
+    key, value = _infer_filter_from_value(" ".join(segment))
+    if key in {"region", "channel", "product"}:
+        _add_filter(filters, key, value)
+        return True
+    return False
+
+
+def fast_plan(text):
+    words = tokenize(text)
+    while words and words[-1] in TRAILING_PUNCT:
+        words = words[:-1]
+
+    for lead in LEAD_TOKENS:
+        if words[: len(lead)] == lead:
+            words = words[len(lead):]
+            break
+    else:
+        return None
+
+    while words and (words[0] in FILLER_TOKENS or words[0] in AGGREGATE_TOKENS):
+        words = words[1:]
+    if not words or words[0] not in REVENUE_TOKENS:
+        return None
+
+    segments = _split_segments(words[1:])
+    if segments is None:
+        return None
+
+    filters = {}
+    months = []
+    for segment in segments:
+        if not _apply_segment(segment, filters, months):
+            return None
+    if len(set(months)) > 1:
+        return None
+    if months:
+        filters["month"] = months[0]
+
+    return plan("READ", "revenue", filters, "sum", None)
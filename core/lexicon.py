@@ -1,26 +1,146 @@
 import json
+import os
+import threading
+
+import spacy
+import srsly
 from spacy.matcher import PhraseMatcher
+from spacy.tokens import DocBin
+
+from .parser import MODEL_NAME, get_nlp
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "data"))
+SCHEMA_PATH = os.path.join(DATA_DIR, "schema_manifest.json")
+SYNONYM_PATH = os.path.join(DATA_DIR, "synonyms.json")
+CACHE_PATH = os.environ.get("LEXICON_CACHE_PATH", os.path.join(DATA_DIR, "lexicon.bin"))
+
+TABLE_LABEL = "TABLE"
+
+_lexicon = None
+_lock = threading.Lock()
+
+
+def _load_json(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def load_terms(schema_path=SCHEMA_PATH, synonym_path=SYNONYM_PATH):
+    # Column names map to themselves and synonyms to their column; table
+    # names only fill phrases nothing else claims.
+    schema = _load_json(schema_path)
+    synonyms = _load_json(synonym_path)
+
+    terms = {}
+    for meta in schema["tables"].values():
+        for col in meta["columns"]:
+            terms[col.lower()] = col
+    for key, values in synonyms.items():
+        for value in values:
+            terms[value.lower()] = key
+    for table in schema["tables"]:
+        terms.setdefault(table.lower(), TABLE_LABEL)
+    return terms
+
+
+def _fingerprint(nlp, paths):
+    stats = [os.stat(path) for path in paths]
+    return [
+        spacy.__version__,
+        MODEL_NAME,
+        nlp.meta.get("version"),
+        *[f"{stat.st_size}:{stat.st_mtime_ns}" for stat in stats],
+    ]
+
+
+def _read_cache(nlp, path, key):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as handle:
+            payload = srsly.msgpack_loads(handle.read())
+        if payload.get("key") != key:
+            return None
+        return list(DocBin().from_bytes(payload["docs"]).get_docs(nlp.vocab))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def _write_cache(path, key, docs):
+    if not path:
+        return
+    doc_bin = DocBin(attrs=["ORTH"], store_user_data=True, docs=docs)
+    payload = srsly.msgpack_dumps({"key": key, "docs": doc_bin.to_bytes()})
+    # Several workers may rebuild at once; each replaces the file atomically.
+    staging = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(staging, "wb") as handle:
+            handle.write(payload)
+        os.replace(staging, path)
+    except OSError:
+        if os.path.exists(staging):
+            os.remove(staging)
+
 
 class Lexicon:
-    def __init__(self, nlp, schema_path, synonym_path):
+    def __init__(
+        self, nlp, schema_path=SCHEMA_PATH, synonym_path=SYNONYM_PATH, cache_path=None
+    ):
+        self.vocab = nlp.vocab
         self.matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
-        self.load(schema_path, synonym_path, nlp)
-
-    def load(self, schema_path, synonym_path, nlp):
-        schema = json.load(open(schema_path))
-        synonyms = json.load(open(synonym_path))
+        self.key = _fingerprint(nlp, [schema_path, synonym_path])
+        self.load(schema_path, synonym_path, nlp, cache_path)
 
-        patterns = []
-        for table, meta in schema["tables"].items():
-            patterns.append(nlp.make_doc(table))
-            for col in meta["columns"]:
-                patterns.append(nlp.make_doc(col))
+    def load(self, schema_path, synonym_path, nlp, cache_path=None):
+        self.terms = load_terms(schema_path, synonym_path)
+        synonyms = _load_json(synonym_path)
+        self.synonyms = {
+            value.lower(): key for key, values in synonyms.items() for value in values
+        }
 
-        for key, values in synonyms.items():
-            for v in values:
-                patterns.append(nlp.make_doc(v))
+        docs = _read_cache(nlp, cache_path, self.key)
+        if docs is None:
+            docs = []
+            for phrase, label in self.terms.items():
+                doc = nlp.make_doc(phrase)
+                doc.user_data["label"] = label
+                docs.append(doc)
+            _write_cache(cache_path, self.key, docs)
 
-        self.matcher.add("DB_ENTITY", patterns)
+        patterns = {}
+        for doc in docs:
+            patterns.setdefault(doc.user_data["label"], []).append(doc)
+        for label, label_docs in patterns.items():
+            self.matcher.add(label, label_docs)
 
     def match(self, doc):
-        return self.matcher(doc)
\ No newline at end of file
+        return self.matcher(doc)
+
+    def resolve(self, doc):
+        # Longer phrases are applied last so "order id" wins over "order".
+        resolved = {}
+        for match_id, start, end in sorted(self.match(doc), key=lambda m: m[2] - m[1]):
+            label = self.vocab.strings[match_id]
+            if label == TABLE_LABEL:
+                continue
+            for index in range(start, end):
+                resolved[index] = label
+        return resolved
+
+    def lookup(self, word):
+        label = self.terms.get(word.lower())
+        return None if label == TABLE_LABEL else label
+
+    def synonym(self, word):
+        return self.synonyms.get(word.lower())
+
+
+def get_lexicon():
+    global _lexicon
+    nlp = get_nlp()
+    key = _fingerprint(nlp, [SCHEMA_PATH, SYNONYM_PATH])
+    if _lexicon is None or _lexicon.key != key:
+        with _lock:
+            if _lexicon is None or _lexicon.key != key:
+                _lexicon = Lexicon(nlp, cache_path=CACHE_PATH)
+    return _lexicon
@@ -1,5 +1,53 @@
+import os
+import threading
+
 import spacy
-nlp = spacy.load("en_core_web_sm")
+
+MODEL_NAME = os.environ.get("SPACY_MODEL", "en_core_web_sm")
+# The walker and intent resolver only read tags, lemmas and dependencies.
+EXCLUDED_COMPONENTS = [
+    name
+    for name in os.environ.get("SPACY_EXCLUDE", "ner").split(",")
+    if name.strip()
+]
+
+PIPE_BATCH_SIZE = int(os.environ.get("PIPE_BATCH_SIZE", "64"))
+PIPE_N_PROCESS = int(os.environ.get("PIPE_N_PROCESS", "1"))
+
+_nlp = None
+_tokenizer = None
+_lock = threading.Lock()
+
+def get_nlp():
+    global _nlp
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:
+                _nlp = spacy.load(MODEL_NAME, exclude=EXCLUDED_COMPONENTS)
+    return _nlp
+
+def get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        with _lock:
+            if _tokenizer is None:
+                _tokenizer = spacy.blank("en").tokenizer
+    return _tokenizer
+
+def warm_up():
+    get_nlp()("show revenue in 2024")
+
+def tokenize(text):
+    return [token.text for token in get_tokenizer()(text)]
 
 def parse(text):
-    return nlp(text)
\ No newline at end of file
+    return get_nlp()(text)
+
+def parse_many(texts, batch_size=None, n_process=None):
+    return list(
+        get_nlp().pipe(
+            texts,
+            batch_size=batch_size or PIPE_BATCH_SIZE,
+            n_process=n_process or PIPE_N_PROCESS,
+        )
+    )
@@ -6,3 +6,20 @@ def plan(intent, metric, filters, aggregation=None, group_by=None):
         "aggregation": aggregation,
         "group_by": group_by,
     }
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return value
+
+
+def plan_key(logical_plan):
+    filters = logical_plan.get("filters") or {}
+    return (
+        logical_plan.get("intent"),
+        logical_plan.get("metric"),
+        tuple(sorted((key, _freeze(value)) for key, value in filters.items())),
+        logical_plan.get("aggregation"),
+        logical_plan.get("group_by"),
+    )
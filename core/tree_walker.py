@@ -1,27 +1,5 @@
-METRIC_ALIASES = {
-    "order": "order_id",
-    "orders": "order_id",
-    "sales": "revenue",
-    "income": "revenue",
-    "revenue": "revenue",
-}
-
-VALID_METRICS = {
-    "order_id",
-    "customer_id",
-    "product",
-    "region",
-    "channel",
-    "order_date",
-    "year",
-    "revenue",
-}
-
-METRIC_PHRASES = {
-    "order id": "order_id",
-    "customer id": "customer_id",
-    "order date": "order_date",
-}
+from .lexicon import get_lexicon
+from .value_index import get_value_index, normalize_value
 
 METRIC_HINTS = {
     "sell": "revenue",
@@ -31,10 +9,6 @@ METRIC_HINTS = {
     "income": "revenue",
 }
 
-REGION_VALUES = {"asia", "europe", "north_america", "south_america"}
-CHANNEL_VALUES = {"online", "partner", "retail"}
-PRODUCT_VALUES = {"iphone", "oneplus", "pixel", "samsung", "xiaomi"}
-
 GROUPABLE_FIELDS = {
     "year": "year",
     "month": "month",
@@ -66,29 +40,19 @@ RELATIVE_TOKENS = {"last", "past", "previous", "recent"}
 QUANTIFIER_MAP = {"couple": 2, "few": 3}
 
 
-def _normalize_value(value):
-    return value.lower().replace("-", "_").replace(" ", "_")
-
-
 def _token_phrase(token):
     parts = [child.text for child in token.lefts if child.dep_ in {"compound", "amod"}]
     parts.append(token.text)
     return " ".join(parts)
 
 
-def _infer_filter_from_value(value):
-    normalized = _normalize_value(value)
+def _infer_filter_from_value(value, index=None):
+    normalized = normalize_value(value)
     if normalized in MONTH_MAP:
         return "month", MONTH_MAP[normalized]
     if normalized.isdigit() and len(normalized) == 4:
         return "year", normalized
-    if normalized in REGION_VALUES:
-        return "region", normalized
-    if normalized in CHANNEL_VALUES:
-        return "channel", normalized
-    if normalized in PRODUCT_VALUES:
-        return "product", normalized
-    return None, None
+    return (index or get_value_index()).resolve(value)
 
 
 def _add_filter(filters, key, value):
@@ -103,28 +67,21 @@ def _add_filter(filters, key, value):
         filters[key] = value
 
 
-def _infer_metric_from_tokens(doc):
+def _infer_metric_from_tokens(doc, lexicon):
     for token in doc:
         lemma = token.lemma_.lower()
-        if lemma in METRIC_ALIASES:
-            return METRIC_ALIASES[lemma]
-        if lemma in METRIC_HINTS:
-            return METRIC_HINTS[lemma]
+        metric = lexicon.synonym(lemma) or METRIC_HINTS.get(lemma)
+        if metric:
+            return metric
     return None
 
 
-def _resolve_metric_from_token(metric_token):
-    phrase = _token_phrase(metric_token).lower()
-    if phrase in METRIC_PHRASES:
-        return METRIC_PHRASES[phrase]
-
-    lemma = metric_token.lemma_.lower()
-    if lemma in METRIC_ALIASES:
-        return METRIC_ALIASES[lemma]
-    if lemma in VALID_METRICS:
-        return lemma
-
-    return None
+def _resolve_metric_from_token(metric_token, terms, lexicon):
+    # Phrases such as "order id" come from the lexicon match over the whole
+    # doc; inflected forms fall back to the lemma.
+    if metric_token.i in terms:
+        return terms[metric_token.i]
+    return lexicon.lookup(metric_token.lemma_)
 
 
 def _extract_relative_months(doc):
@@ -166,6 +123,10 @@ def walk(doc):
     metric_hint = None
     months = []
     year_tokens = []
+    index = get_value_index()
+    mentions = index.match(doc)
+    lexicon = get_lexicon()
+    terms = lexicon.resolve(doc)
 
     for token in doc:
         lemma = token.lemma_.lower()
@@ -181,7 +142,9 @@ def walk(doc):
             tokens = [token] + list(token.conjuncts)
             for item in tokens:
                 phrase = _token_phrase(item)
-                key, value = _infer_filter_from_value(phrase)
+                key, value = _infer_filter_from_value(phrase, index)
+                if key is None and item.i in mentions:
+                    key, value = mentions[item.i]
                 if key == "month":
                     months.append(value)
                 elif key:
@@ -212,9 +175,9 @@ def walk(doc):
             filters["last_months"] = last_months
 
     if metric_token:
-        metric = _resolve_metric_from_token(metric_token)
+        metric = _resolve_metric_from_token(metric_token, terms, lexicon)
     else:
-        metric = _infer_metric_from_tokens(doc)
+        metric = _infer_metric_from_tokens(doc, lexicon)
 
     if not metric and metric_hint:
         metric = metric_hint
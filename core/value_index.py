@@ -0,0 +1,86 @@
+import threading
+
+from execution.data_loader import data_version, dimension_values
+
+# Values known before any data is loaded; the catalog written at ingest is
+# merged on top of them.
+SEED_VALUES = {
+    "region": {"asia", "europe", "north_america", "south_america"},
+    "channel": {"online", "partner", "retail"},
+    "product": {"iphone", "oneplus", "pixel", "samsung", "xiaomi"},
+}
+DIMENSION_ORDER = ["region", "channel", "product", "customer_id"]
+
+_END = ""
+_index = None
+_lock = threading.Lock()
+
+
+def normalize_value(value):
+    return value.lower().replace("-", "_").replace(" ", "_")
+
+
+def _parts(value):
+    return [part for part in normalize_value(value).split("_") if part]
+
+
+class ValueIndex:
+    def __init__(self, values):
+        self.lookup = {}
+        self.trie = {}
+        for dimension in DIMENSION_ORDER:
+            for value in sorted(values.get(dimension, ())):
+                normalized = normalize_value(value)
+                if normalized in self.lookup:
+                    continue
+                self.lookup[normalized] = (dimension, value)
+                parts = _parts(value)
+                if not parts:
+                    continue
+                node = self.trie
+                for part in parts:
+                    node = node.setdefault(part, {})
+                node[_END] = (dimension, value)
+
+    def resolve(self, phrase):
+        return self.lookup.get(normalize_value(phrase), (None, None))
+
+    def match(self, doc):
+        # Tokens are split on the same separators as the values, then the
+        # longest mention starting at each position is taken from the trie.
+        parts = []
+        for token in doc:
+            parts.extend((part, token.i) for part in _parts(token.text))
+
+        mentions = {}
+        start = 0
+        while start < len(parts):
+            node = self.trie
+            found = None
+            position = start
+            while position < len(parts) and parts[position][0] in node:
+                node = node[parts[position][0]]
+                position += 1
+                if _END in node:
+                    found = (position, node[_END])
+            if found is None:
+                start += 1
+                continue
+            end, entry = found
+            for _, token_index in parts[start:end]:
+                mentions[token_index] = entry
+            start = end
+        return mentions
+
+
+def get_value_index():
+    global _index
+    version = data_version()
+    if _index is None or _index[0] != version:
+        with _lock:
+            if _index is None or _index[0] != version:
+                values = {key: set(items) for key, items in SEED_VALUES.items()}
+                for dimension, items in dimension_values().items():
+                    values.setdefault(dimension, set()).update(items)
+                _index = (version, ValueIndex(values))
+    return _index[1]
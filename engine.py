@@ -1,53 +1,195 @@
-from utils.text_cleaner import clean
-from core.parser import parse
+import json
+import os
+
+from utils import metrics, trace_log
+from utils.cache import MISSING, create_cache
+from utils.text_cleaner import normalize
+from core import fast_path
+from core.lexicon import get_lexicon
+from core.parser import parse, parse_many, warm_up as warm_up_parser
 from core.tree_walker import walk
+from core.value_index import get_value_index
 from core.intent import resolve
 from core.planner import plan
-from execution.executor import execute
+from execution.data_loader import data_version
+from execution.executor import execute, execute_many, stream_rows
 from response.formatter import format
 
+PLAN_CACHE_SIZE = int(os.environ.get("PLAN_CACHE_SIZE", "4096"))
+PLAN_CACHE_TTL = float(os.environ.get("PLAN_CACHE_TTL", "3600"))
+PLAN_CACHE_PATH = os.environ.get("PLAN_CACHE_PATH")
+
+plan_cache = create_cache(
+    PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL, path=PLAN_CACHE_PATH, table="plan_cache"
+)
+
+
+def warm_up():
+    warm_up_parser()
+    get_lexicon()
+    get_value_index()
+
+
+def _tree_node(token):
+    return {
+        "text": token.text,
+        "dep": token.dep_,
+        "children": [_tree_node(child) for child in token.children],
+    }
+
 
-def _print_tree_node(token, indent, is_last):
+def parse_tree(doc):
+    return [_tree_node(token) for token in doc if token.head == token]
+
+
+def _tree_lines(node, indent, is_last):
     branch = "`- " if is_last else "|- "
-    print(f"{indent}{branch}{token.text} ({token.dep_})")
-    children = list(token.children)
+    yield f"{indent}{branch}{node['text']} ({node['dep']})"
+    children = node["children"]
     next_indent = indent + ("   " if is_last else "|  ")
     for index, child in enumerate(children):
-        _print_tree_node(child, next_indent, index == len(children) - 1)
+        yield from _tree_lines(child, next_indent, index == len(children) - 1)
 
 
-def _print_parse_tree(doc):
-    roots = [t for t in doc if t.head == t]
-    if not roots:
-        print("Parse tree: <empty>")
-        return
-    print("Parse tree:")
-    for index, root in enumerate(roots):
-        _print_tree_node(root, "", index == len(roots) - 1)
+def format_tree(tree):
+    if not tree:
+        return "Parse tree: <empty>"
+    lines = ["Parse tree:"]
+    for index, root in enumerate(tree):
+        lines.extend(_tree_lines(root, "", index == len(tree) - 1))
+    return "\n".join(lines)
 
 
-def analyze(question, show_tree=False):
-    q = clean(question)
-    doc = parse(q)
-    if show_tree:
-        _print_parse_tree(doc)
-    metric, filters, aggregation, group_by = walk(doc)
-    intent = resolve(doc)
-    logical_plan = plan(intent, metric, filters, aggregation, group_by)
-    result = execute(logical_plan)
+def _analysis(question, logical_plan, result):
     return {
         "question": question,
-        "metric": metric,
-        "filters": filters,
-        "intent": intent,
-        "aggregation": aggregation,
-        "group_by": group_by,
+        "metric": logical_plan["metric"],
+        "filters": logical_plan["filters"],
+        "intent": logical_plan["intent"],
+        "aggregation": logical_plan["aggregation"],
+        "group_by": logical_plan["group_by"],
         "result": result,
     }
 
 
+def _plan_doc(doc):
+    with metrics.stage("walk"):
+        metric, filters, aggregation, group_by = walk(doc)
+    with metrics.stage("resolve"):
+        intent = resolve(doc)
+    with metrics.stage("plan"):
+        return plan(intent, metric, filters, aggregation, group_by)
+
+
+def _plan_cache_key(version, q):
+    # Filter values are resolved against the catalog loaded at ingest, so a
+    # plan is only reused while the data it was built against is current.
+    return json.dumps([version, q])
+
+
+def _plan_question(q, show_tree):
+    # The tree is only built when the caller asked for it or the debug log
+    # is on; otherwise cached and fast-path plans skip the parse entirely.
+    key = _plan_cache_key(data_version(), q)
+    if not show_tree:
+        cached = plan_cache.get(key)
+        if cached is not MISSING:
+            metrics.count("cache_hits", cache="plan")
+            return cached, None
+        metrics.count("cache_misses", cache="plan")
+        if fast_path.ENABLED:
+            with metrics.stage("fast_path"):
+                logical_plan = fast_path.fast_plan(q)
+            if logical_plan is not None:
+                plan_cache.set(key, logical_plan)
+                return logical_plan, None
+
+    with metrics.stage("parse"):
+        doc = parse(q)
+    tree = None
+    if show_tree or trace_log.enabled():
+        tree = parse_tree(doc)
+        trace_log.log_tree(q, tree)
+    logical_plan = _plan_doc(doc)
+    plan_cache.set(key, logical_plan)
+    return logical_plan, tree
+
+
+def plan_question(question):
+    return _plan_question(normalize(question), show_tree=False)[0]
+
+
+def _fetch_limit(limit):
+    # Listings fetch one row past the page; that row only tells whether
+    # another page exists and is never returned.
+    return limit + 1 if limit is not None else None
+
+
+def _page_analysis(analysis, limit):
+    if analysis["intent"] == "LIST" and limit is not None:
+        rows = analysis["result"]
+        analysis["more"] = len(rows) > limit
+        analysis["result"] = rows[:limit]
+    return analysis
+
+
+def analyze(question, show_tree=False, limit=None, after=None, debug=False):
+    with metrics.trace() as current, metrics.stage("analyze"):
+        with metrics.stage("clean"):
+            q = normalize(question)
+        logical_plan, tree = _plan_question(q, show_tree)
+        with metrics.stage("execute"):
+            result = execute(logical_plan, limit=_fetch_limit(limit), after=after)
+    analysis = _page_analysis(_analysis(question, logical_plan, result), limit)
+    if analysis.get("more") is False and after is not None:
+        # The last page of a paged listing only holds the remainder, so the
+        # answer reports the full count alongside it.
+        analysis["total"] = execute(dict(logical_plan, intent="COUNT"))
+    if show_tree:
+        analysis["parse_tree"] = tree
+    if debug:
+        analysis["metrics"] = current
+    return analysis
+
+
+def export_rows(question, chunk_size=1000):
+    return stream_rows(plan_question(question), chunk_size=chunk_size)
+
+
+def analyze_many(questions, batch_size=None, n_process=None, limit=None):
+    keys = [normalize(question) for question in questions]
+    version = data_version()
+    plans = {}
+    for key in keys:
+        if key not in plans:
+            cached = plan_cache.get(_plan_cache_key(version, key))
+            if cached is not MISSING:
+                plans[key] = cached
+
+    pending = [key for key in dict.fromkeys(keys) if key not in plans]
+    metrics.count("cache_hits", len(plans), cache="plan")
+    metrics.count("cache_misses", len(pending), cache="plan")
+    with metrics.stage("parse"):
+        docs = parse_many(pending, batch_size=batch_size, n_process=n_process)
+    for key, doc in zip(pending, docs):
+        if trace_log.enabled():
+            trace_log.log_tree(key, parse_tree(doc))
+        plans[key] = _plan_doc(doc)
+        plan_cache.set(_plan_cache_key(version, key), plans[key])
+
+    plans = [plans[key] for key in keys]
+    with metrics.stage("execute"):
+        results = execute_many(plans, limit=_fetch_limit(limit))
+    return [
+        _page_analysis(_analysis(question, logical_plan, result), limit)
+        for question, logical_plan, result in zip(questions, plans, results)
+    ]
+
+
 def ask(question, show_tree=False):
     analysis = analyze(question, show_tree=show_tree)
+    if show_tree:
+        print(format_tree(analysis["parse_tree"]))
     return format(analysis["metric"], analysis["result"], analysis["filters"])
 
 
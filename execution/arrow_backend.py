@@ -0,0 +1,242 @@
+import os
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as pa_dataset
+    from pyarrow import fs as pa_fs
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+from .data_loader import (
+    COLUMNS,
+    NUMERIC_COLUMNS,
+    PRIMARY_KEY,
+    YEAR_TABLES,
+    columnar_format,
+    columnar_path,
+)
+from .sql_compiler import MONTH_FILTER_KEYS, UnsupportedPlan
+
+_partitions = None
+_lock = threading.Lock()
+
+
+def _open_partition(path, year):
+    # Files are memory-mapped, so uncompressed Arrow IPC columns are read
+    # without copying. Tagging each file with its year lets year predicates
+    # skip whole files before any column is decoded.
+    base = pa_dataset.dataset(
+        path,
+        format=columnar_format(path),
+        filesystem=pa_fs.LocalFileSystem(use_mmap=True),
+    )
+    year_type = base.schema.field("year").type
+    return pa_dataset.FileSystemDataset.from_paths(
+        [path],
+        schema=base.schema,
+        format=base.format,
+        filesystem=base.filesystem,
+        partitions=[pc.field("year") == pa.scalar(int(year)).cast(year_type)],
+    )
+
+
+def get_partitions():
+    global _partitions
+    if pa is None:
+        raise UnsupportedPlan("pyarrow is not installed")
+    paths = {
+        table_name: columnar_path(year) for year, table_name in YEAR_TABLES.items()
+    }
+    if not all(paths.values()):
+        raise UnsupportedPlan("Not every partition has a Parquet or Arrow file")
+    key = tuple(
+        (path, os.stat(path).st_size, os.stat(path).st_mtime_ns)
+        for path in paths.values()
+    )
+    if _partitions is None or _partitions[0] != key:
+        with _lock:
+            if _partitions is None or _partitions[0] != key:
+                years = {table_name: year for year, table_name in YEAR_TABLES.items()}
+                _partitions = (
+                    key,
+                    {
+                        table_name: _open_partition(path, years[table_name])
+                        for table_name, path in paths.items()
+                    },
+                )
+    return _partitions[1]
+
+
+def _typed(data_type, values):
+    if pa.types.is_integer(data_type):
+        convert = int
+    elif pa.types.is_floating(data_type) or pa.types.is_decimal(data_type):
+        convert = float
+    else:
+        convert = str
+    typed = []
+    for value in values:
+        try:
+            typed.append(convert(value))
+        except (TypeError, ValueError):
+            continue
+    return pa.array(typed).cast(data_type)
+
+
+def _expression(schema, filters, after=None):
+    expression = pc.scalar(True)
+    for key, value in filters.items():
+        if key in MONTH_FILTER_KEYS:
+            continue
+        if key not in COLUMNS:
+            raise UnsupportedPlan(f"Unknown column: {key}")
+        values = value if isinstance(value, (list, tuple)) else [value]
+        expression &= pc.field(key).isin(_typed(schema.field(key).type, values))
+    if after is not None:
+        expression &= pc.field(PRIMARY_KEY) > int(after)
+    return expression
+
+
+def _has_month_filter(filters):
+    return any(filters.get(key) for key in MONTH_FILTER_KEYS)
+
+
+def _month_parts(table):
+    dates = table.column("order_date")
+    if not (pa.types.is_date(dates.type) or pa.types.is_timestamp(dates.type)):
+        dates = pc.strptime(
+            dates.cast(pa.string()), format="%Y-%m-%d", unit="s", error_is_null=True
+        )
+    month = pc.month(dates)
+    return month, pc.add(pc.multiply(pc.year(dates), 12), month)
+
+
+def _between(values, low, high):
+    return pc.and_(pc.greater_equal(values, low), pc.less_equal(values, high))
+
+
+def _filter_months(table, filters):
+    month, index = _month_parts(table)
+    mask = pc.is_valid(index)
+
+    if filters.get("month"):
+        mask = pc.and_(mask, pc.equal(month, int(filters["month"])))
+    elif filters.get("month_start") and filters.get("month_end"):
+        mask = pc.and_(
+            mask,
+            _between(month, int(filters["month_start"]), int(filters["month_end"])),
+        )
+
+    index_start = filters.get("month_index_start")
+    index_end = filters.get("month_index_end")
+    if index_start is not None and index_end is not None:
+        mask = pc.and_(mask, _between(index, int(index_start), int(index_end)))
+
+    last_months = filters.get("last_months")
+    if last_months:
+        anchor = pc.max(pc.filter(index, mask)).as_py()
+        if anchor is not None:
+            threshold = anchor - (int(last_months) - 1)
+            mask = pc.and_(mask, pc.greater_equal(index, threshold))
+    return table.filter(pc.fill_null(mask, False))
+
+
+def _scan(tables, filters, columns, after=None):
+    partitions = get_partitions()
+    filters = filters or {}
+    if _has_month_filter(filters):
+        columns = columns + ["order_date"]
+    columns = list(dict.fromkeys(columns))
+
+    pieces = [
+        partitions[name].to_table(
+            columns=columns,
+            filter=_expression(partitions[name].schema, filters, after),
+        )
+        for name in tables or partitions
+    ]
+    table = pa.concat_tables(pieces, promote_options="permissive")
+    if _has_month_filter(filters):
+        table = _filter_months(table, filters)
+    return table
+
+
+def _value(name, value):
+    if name == "revenue" and isinstance(value, float) and value.is_integer():
+        return int(value)
+    if name == "order_date" and value is not None and not isinstance(value, str):
+        return value.isoformat()
+    return value
+
+
+def count(tables, filters):
+    filters = filters or {}
+    if _has_month_filter(filters):
+        return _scan(tables, filters, []).num_rows
+    partitions = get_partitions()
+    return sum(
+        partitions[name].count_rows(
+            filter=_expression(partitions[name].schema, filters)
+        )
+        for name in tables or partitions
+    )
+
+
+def total(tables, filters, metric):
+    if metric not in NUMERIC_COLUMNS:
+        return count(tables, filters), 0.0
+    table = _scan(tables, filters, [metric])
+    return table.num_rows, float(pc.sum(table[metric], min_count=0).as_py())
+
+
+def first(tables, filters, metric):
+    if metric not in COLUMNS:
+        raise UnsupportedPlan(f"Unknown column: {metric}")
+    table = _scan(tables, filters, [PRIMARY_KEY, metric])
+    if not table.num_rows:
+        return None
+    keys = table[PRIMARY_KEY]
+    position = pc.index(keys, pc.min(keys)).as_py()
+    return _value(metric, table[metric][position].as_py())
+
+
+def group_max(tables, filters, group_by, metric, basis):
+    if group_by != "month" and group_by not in COLUMNS:
+        raise UnsupportedPlan(f"Unsupported arrow group: {group_by}")
+    columns = ["order_date" if group_by == "month" else group_by]
+    if basis != "count":
+        columns.append(metric)
+    table = _scan(tables, filters, columns)
+
+    keys = _month_parts(table)[0] if group_by == "month" else table[group_by]
+    grouped = pa.table({"key": keys, "value": table[columns[-1]]})
+    grouped = grouped.filter(pc.is_valid(grouped["key"]))
+    if not grouped.num_rows:
+        return None
+
+    if basis == "count":
+        grouped = grouped.group_by("key").aggregate([("key", "count")])
+        value_column = "key_count"
+    else:
+        grouped = grouped.group_by("key").aggregate(
+            [("value", "sum", pc.ScalarAggregateOptions(min_count=0))]
+        )
+        value_column = "value_sum"
+    best = grouped.sort_by([(value_column, "descending"), ("key", "ascending")])
+    best = best.slice(0, 1).to_pylist()[0]
+    value = best[value_column]
+    value = int(value) if basis == "count" else float(value)
+    return best["key"], value
+
+
+def list_rows(tables, filters, limit=None, after=None):
+    table = _scan(tables, filters, list(COLUMNS), after=after)
+    table = table.sort_by(PRIMARY_KEY)
+    if limit is not None:
+        table = table.slice(0, limit)
+    return [
+        {name: _value(name, row[name]) for name in COLUMNS}
+        for row in table.select(COLUMNS).to_pylist()
+    ]
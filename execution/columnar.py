@@ -0,0 +1,254 @@
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from .data_loader import (
+    COLUMNS,
+    NUMERIC_COLUMNS,
+    PRIMARY_KEY,
+    YEAR_TABLES,
+    data_version,
+    fetch,
+)
+from .sql_compiler import MONTH_FILTER_KEYS, UnsupportedPlan
+
+CATEGORICAL_COLUMNS = ["customer_id", "product", "region", "channel"]
+INTEGER_COLUMNS = ["order_id", "year"]
+GROUP_COLUMNS = set(CATEGORICAL_COLUMNS) | {"year", "month"}
+
+_store = None
+_lock = threading.Lock()
+
+
+class ColumnarStore:
+    def __init__(self, version, partitions):
+        self.version = version
+        self.slices = {}
+        self._selections = {}
+        self.dictionaries = {}
+        self.columns = {}
+
+        rows = []
+        for table_name, table_rows in partitions.items():
+            self.slices[table_name] = slice(len(rows), len(rows) + len(table_rows))
+            rows.extend(table_rows)
+        self.size = len(rows)
+
+        for name in INTEGER_COLUMNS:
+            self.columns[name] = np.array(
+                [row[name] or 0 for row in rows], dtype=np.int64
+            )
+        self.columns["revenue"] = np.array(
+            [row["revenue"] or 0.0 for row in rows], dtype=np.float64
+        )
+        self.columns["order_date"] = np.array(
+            [row["order_date"] for row in rows], dtype=object
+        )
+        for name in ["month", "month_index"]:
+            self.columns[name] = np.array(
+                [row[name] or 0 for row in rows], dtype=np.int64
+            )
+
+        # Codes follow sorted value order so argmax ties resolve to the
+        # smallest key, matching the SQL path. Missing values get the last code.
+        for name in CATEGORICAL_COLUMNS:
+            values = sorted({row[name] for row in rows if row[name] is not None})
+            lookup = {value: code for code, value in enumerate(values)}
+            missing = len(values)
+            self.dictionaries[name] = (values, lookup)
+            self.columns[name] = np.array(
+                [lookup.get(row[name], missing) for row in rows], dtype=np.int32
+            )
+
+    def selection(self, tables):
+        # Pruned partitions are addressed by a slice when they sit next to each
+        # other and by an index array otherwise.
+        tables = tuple(tables) or tuple(self.slices)
+        selection = self._selections.get(tables)
+        if selection is None:
+            parts = [self.slices[name] for name in tables]
+            if all(a.stop == b.start for a, b in zip(parts, parts[1:])):
+                selection = slice(parts[0].start, parts[-1].stop)
+            else:
+                selection = np.concatenate(
+                    [np.arange(part.start, part.stop) for part in parts]
+                )
+            self._selections[tables] = selection
+        return selection
+
+    def view(self, tables, name):
+        return self.columns[name][self.selection(tables)]
+
+    def value(self, tables, name, index):
+        selection = self.selection(tables)
+        if isinstance(selection, slice):
+            raw = self.columns[name][selection.start + index]
+        else:
+            raw = self.columns[name][selection[index]]
+        if name in self.dictionaries:
+            values = self.dictionaries[name][0]
+            return values[raw] if raw < len(values) else None
+        if name == "revenue":
+            raw = float(raw)
+            return int(raw) if raw.is_integer() else raw
+        if name in INTEGER_COLUMNS:
+            return int(raw)
+        return raw
+
+
+def get_store():
+    global _store
+    if np is None:
+        raise UnsupportedPlan("numpy is not installed")
+    version = data_version()
+    if _store is None or _store.version != version:
+        with _lock:
+            if _store is None or _store.version != version:
+                columns = ", ".join(COLUMNS + ["month", "month_index"])
+                partitions = {
+                    table_name: fetch(
+                        f"SELECT {columns} FROM {table_name} ORDER BY {PRIMARY_KEY}"
+                    )
+                    for table_name in YEAR_TABLES.values()
+                }
+                _store = ColumnarStore(version, partitions)
+    return _store
+
+
+def _equals(store, tables, name, value):
+    column = store.view(tables, name)
+    if name in store.dictionaries:
+        code = store.dictionaries[name][1].get(value)
+        if code is None:
+            return np.zeros(len(column), dtype=bool)
+        return column == code
+    try:
+        return column == int(value)
+    except (TypeError, ValueError):
+        return np.zeros(len(column), dtype=bool)
+
+
+def _value_mask(store, tables, filters):
+    mask = np.ones(len(store.view(tables, PRIMARY_KEY)), dtype=bool)
+    for key, value in filters.items():
+        if key in MONTH_FILTER_KEYS:
+            continue
+        if key not in store.columns or key == "order_date":
+            raise UnsupportedPlan(f"Unsupported columnar filter: {key}")
+        if isinstance(value, (list, tuple)):
+            matches = np.zeros(len(mask), dtype=bool)
+            for item in value:
+                matches |= _equals(store, tables, key, item)
+            mask &= matches
+        else:
+            mask &= _equals(store, tables, key, value)
+    return mask
+
+
+def filter_mask(store, tables, filters):
+    filters = filters or {}
+    mask = _value_mask(store, tables, filters)
+
+    month = filters.get("month")
+    month_start = filters.get("month_start")
+    month_end = filters.get("month_end")
+    months = store.view(tables, "month")
+    if month:
+        mask &= months == int(month)
+    elif month_start and month_end:
+        mask &= (months >= int(month_start)) & (months <= int(month_end))
+
+    index_start = filters.get("month_index_start")
+    index_end = filters.get("month_index_end")
+    if index_start is not None and index_end is not None:
+        index = store.view(tables, "month_index")
+        mask &= (index >= int(index_start)) & (index <= int(index_end))
+
+    last_months = filters.get("last_months")
+    if last_months:
+        index = store.view(tables, "month_index")
+        dated = mask & (index > 0)
+        if dated.any():
+            threshold = index[dated].max() - (int(last_months) - 1)
+            mask = dated & (index >= threshold)
+        else:
+            mask = dated
+    return mask
+
+
+def count(tables, filters):
+    store = get_store()
+    return int(filter_mask(store, tables, filters).sum())
+
+
+def total(tables, filters, metric):
+    store = get_store()
+    mask = filter_mask(store, tables, filters)
+    rows = int(mask.sum())
+    if metric not in NUMERIC_COLUMNS:
+        return rows, 0.0
+    return rows, float(store.view(tables, metric)[mask].sum())
+
+
+def _ordered(store, tables, mask):
+    indexes = np.flatnonzero(mask)
+    if len(tables) != 1:
+        # Partitions are each sorted by order_id, but not across each other.
+        keys = store.view(tables, PRIMARY_KEY)[indexes]
+        indexes = indexes[np.argsort(keys, kind="stable")]
+    return indexes
+
+
+def first(tables, filters, metric):
+    if metric not in COLUMNS:
+        raise UnsupportedPlan(f"Unknown column: {metric}")
+    store = get_store()
+    indexes = _ordered(store, tables, filter_mask(store, tables, filters))
+    if not len(indexes):
+        return None
+    return store.value(tables, metric, indexes[0])
+
+
+def group_max(tables, filters, group_by, metric, basis):
+    if group_by not in GROUP_COLUMNS:
+        raise UnsupportedPlan(f"Unsupported columnar group: {group_by}")
+    store = get_store()
+    mask = filter_mask(store, tables, filters)
+    keys = store.view(tables, group_by)[mask]
+    weights = None if basis == "count" else store.view(tables, metric)[mask]
+
+    if group_by in store.dictionaries:
+        values = store.dictionaries[group_by][0]
+        sums = np.bincount(keys, weights=weights, minlength=len(values) + 1)
+        present = np.bincount(keys, minlength=len(values) + 1)[: len(values)] > 0
+        labels = values
+        sums = sums[: len(values)]
+    else:
+        labels, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=weights, minlength=len(labels))
+        present = labels > 0
+        labels = [int(label) for label in labels]
+
+    if not present.any():
+        return None
+    candidates = np.where(present, sums, -np.inf)
+    best = int(np.argmax(candidates))
+    value = int(sums[best]) if basis == "count" else float(sums[best])
+    return labels[best], value
+
+
+def list_rows(tables, filters, limit=None, after=None):
+    store = get_store()
+    mask = filter_mask(store, tables, filters)
+    if after is not None:
+        mask &= store.view(tables, PRIMARY_KEY) > int(after)
+    indexes = _ordered(store, tables, mask)
+    if limit is not None:
+        indexes = indexes[:limit]
+    return [
+        {name: store.value(tables, name, index) for name in COLUMNS}
+        for index in indexes
+    ]
@@ -0,0 +1,48 @@
+import sqlite3
+import threading
+
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+_connections = []
+_lock = threading.Lock()
+_generation = 0
+
+
+def open_connection(path):
+    # Pooled connections stay on the thread that opened them; check_same_thread
+    # is only relaxed so close_all() can release them from any thread.
+    connection = sqlite3.connect(
+        f"file:{path}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    connection.row_factory = sqlite3.Row
+    connection.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return connection
+
+
+def get_connection(path):
+    if getattr(_local, "generation", None) != _generation:
+        _local.connections = {}
+        _local.generation = _generation
+    connection = _local.connections.get(path)
+    if connection is None:
+        connection = _local.connections[path] = open_connection(path)
+        with _lock:
+            _connections.append(connection)
+    return connection
+
+
+def close_all():
+    global _generation
+    with _lock:
+        connections = list(_connections)
+        _connections.clear()
+        _generation += 1
+    for connection in connections:
+        connection.close()
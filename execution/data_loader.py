@@ -1,11 +1,35 @@
+import argparse
 import csv
+import functools
+import hashlib
+import io
 import os
+import shutil
 import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_dataset
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    pa_dataset = None
+
+from .connection_pool import get_connection, open_connection
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-DB_PATH = os.path.join(BASE_DIR, "semantic_parser_large_sales_db", "sales_orders.db")
-DATA_DIR = os.path.join(
-    BASE_DIR, "semantic_parser_large_sales_db", "data_store", "sales_orders"
+DB_PATH = os.environ.get(
+    "SALES_DB_PATH",
+    os.path.join(BASE_DIR, "semantic_parser_large_sales_db", "sales_orders.db"),
+)
+DATA_DIR = os.environ.get(
+    "SALES_DATA_DIR",
+    os.path.join(
+        BASE_DIR, "semantic_parser_large_sales_db", "data_store", "sales_orders"
+    ),
 )
 
 YEAR_TABLES = {
@@ -21,6 +45,10 @@ CSV_YEAR_FILES = {
     "2023": os.path.join(DATA_DIR, "year=2023.csv"),
     "2024": os.path.join(DATA_DIR, "year=2024.csv"),
 }
+ALL_CSV = os.path.join(DATA_DIR, "all.csv")
+# Columnar partitions use the same "year=YYYY" naming as the CSVs and take
+# precedence over them when pyarrow is installed.
+COLUMNAR_FORMATS = {".parquet": "parquet", ".arrow": "ipc"}
 
 ALL_VIEW = "sales_orders_all"
 COLUMNS = [
@@ -33,12 +61,88 @@ COLUMNS = [
     "year",
     "revenue",
 ]
+DERIVED_COLUMNS = ["month", "year_month", "month_index"]
+COLUMN_TYPES = {
+    "order_id": "INTEGER",
+    "customer_id": "TEXT",
+    "product": "TEXT",
+    "region": "TEXT",
+    "channel": "TEXT",
+    "order_date": "TEXT",
+    "year": "INTEGER",
+    "revenue": "NUMERIC",
+    "month": "INTEGER",
+    "year_month": "INTEGER",
+    "month_index": "INTEGER",
+}
+PRIMARY_KEY = "order_id"
+NUMERIC_COLUMNS = {
+    col for col in COLUMNS if COLUMN_TYPES[col] in {"INTEGER", "NUMERIC"}
+}
+
+INDEXES = {
+    "year": ["year", "revenue"],
+    "month": ["month", "revenue"],
+    "month_index": ["month_index", "revenue"],
+    "region": ["region", "month_index", "revenue"],
+    "product": ["product", "month_index", "revenue"],
+    "channel": ["channel", "month_index", "revenue"],
+    "customer": ["customer_id", "revenue"],
+}
+
+# Pre-aggregated tables, smallest first. Each groups every order by its
+# dimensions and keeps the measures below.
+ROLLUPS = {
+    "sales_rollup_month": ["year", "month_index", "month"],
+    "sales_rollup_full": [
+        "year",
+        "month_index",
+        "month",
+        "region",
+        "product",
+        "channel",
+    ],
+}
+ROLLUP_MEASURES = {
+    "order_count": "COUNT(*)",
+    "revenue_sum": "TOTAL(revenue)",
+}
+
+# Per-partition date bounds and month coverage, written at ingest so
+# pruning and relative windows never scan the year tables.
+PARTITION_TABLE = "sales_partitions"
+# Filters that can be answered from partition metadata alone.
+PARTITION_FILTER_KEYS = {"year", "last_months"}
 
+# Distinct dimension values, in the order a mention is resolved when the
+# same name appears in more than one dimension.
+VALUES_TABLE = "sales_values"
+VALUE_DIMENSIONS = ["region", "channel", "product", "customer_id"]
 
-def _read_csv_rows(path):
-    with open(path, newline="") as handle:
-        reader = csv.DictReader(handle)
-        return [row for row in reader]
+SCHEMA_VERSION = 6
+META_TABLE = "sales_meta"
+
+# Rows are streamed from the CSVs and inserted this many at a time. With more
+# than one worker, each source file is parsed in its own process into a
+# staging database that is merged into the main one.
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "10000"))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "1"))
+
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+_partition_stats = None
+_stats_lock = threading.Lock()
+
+
+def _iter_csv_rows(path, offset=0):
+    # Reading from an offset reuses the header line, so an appended tail can
+    # be parsed without re-reading the rows before it.
+    with open(path, "rb") as raw:
+        handle = io.TextIOWrapper(raw, newline="")
+        fieldnames = next(csv.reader([handle.readline()]), None)
+        if offset:
+            handle.seek(offset)
+        yield from csv.DictReader(handle, fieldnames=fieldnames)
 
 
 def _table_exists(cursor, name):
@@ -50,77 +154,772 @@ def _table_exists(cursor, name):
 
 
 def _create_table(cursor, name):
-    column_sql = ", ".join(f"{col} TEXT" for col in COLUMNS)
-    cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} ({column_sql})")
+    column_sql = ", ".join(
+        f"{col} {COLUMN_TYPES[col]}" + (" PRIMARY KEY" if col == PRIMARY_KEY else "")
+        for col in COLUMNS + DERIVED_COLUMNS
+    )
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS main.{name} ({column_sql})")
+
+
+def _create_indexes(cursor, name):
+    for suffix, columns in INDEXES.items():
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS main.idx_{name}_{suffix} "
+            f"ON {name} ({', '.join(columns)})"
+        )
+
+
+def _create_view(cursor):
+    cursor.execute(f"DROP VIEW IF EXISTS main.{ALL_VIEW}")
+    union_sql = " UNION ALL ".join(
+        f"SELECT * FROM {table_name}" for table_name in YEAR_TABLES.values()
+    )
+    cursor.execute(f"CREATE VIEW main.{ALL_VIEW} AS {union_sql}")
 
 
-def _insert_rows(cursor, table_name, rows):
-    if not rows:
+@functools.lru_cache(maxsize=8192)
+def _date_parts(value):
+    try:
+        parsed = datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None, None, None
+    return (
+        parsed.month,
+        parsed.year * 100 + parsed.month,
+        parsed.year * 12 + parsed.month,
+    )
+
+
+def _row_values(row):
+    values = [None if row.get(col) in (None, "") else row[col] for col in COLUMNS]
+    values.extend(_date_parts(row.get("order_date")))
+    return values
+
+
+def _insert_rows(cursor, table_name, values):
+    if not values:
         return
-    placeholders = ", ".join("?" for _ in COLUMNS)
-    values = [[row.get(col, "") for col in COLUMNS] for row in rows]
+    columns = COLUMNS + DERIVED_COLUMNS
+    placeholders = ", ".join("?" for _ in columns)
     cursor.executemany(
-        f"INSERT INTO {table_name} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+        f"INSERT OR REPLACE INTO {table_name} ({', '.join(columns)}) "
+        f"VALUES ({placeholders})",
         values,
     )
 
 
-def _ensure_year_table(cursor, year, table_name):
-    _create_table(cursor, table_name)
-    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-    count = cursor.fetchone()[0]
-    if count:
-        return
+def columnar_path(year):
+    if pa_dataset is None:
+        return None
+    for extension in COLUMNAR_FORMATS:
+        path = os.path.join(DATA_DIR, f"year={year}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def columnar_format(path):
+    return COLUMNAR_FORMATS[os.path.splitext(path)[1]]
+
+
+def _iter_columnar_rows(path, batch_size=INGEST_CHUNK_SIZE):
+    dataset = pa_dataset.dataset(path, format=columnar_format(path))
+    columns = [name for name in COLUMNS if name in dataset.schema.names]
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+        # Dates are stored as strings in SQLite whatever their Arrow type.
+        if not pa.types.is_string(batch.schema.field("order_date").type):
+            index = batch.schema.get_field_index("order_date")
+            batch = batch.set_column(
+                index, "order_date", batch.column(index).cast(pa.string())
+            )
+        yield from batch.to_pylist()
 
+
+def _iter_source_rows(path, offset=0):
+    if os.path.splitext(path)[1] in COLUMNAR_FORMATS:
+        return _iter_columnar_rows(path)
+    return _iter_csv_rows(path, offset)
+
+
+def _source_path(year):
+    path = columnar_path(year)
+    if path:
+        return path
     csv_path = CSV_YEAR_FILES.get(year)
     if csv_path and os.path.exists(csv_path):
-        rows = _read_csv_rows(csv_path)
+        return csv_path
+    return ALL_CSV
+
+
+def _fingerprint(path):
+    if not os.path.exists(path):
+        return ""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _expected_meta():
+    meta = {"schema_version": str(SCHEMA_VERSION)}
+    for year in YEAR_TABLES:
+        path = _source_path(year)
+        meta[f"source:{year}"] = f"{os.path.basename(path)}:{_fingerprint(path)}"
+    return meta
+
+
+def _read_meta(cursor):
+    if not _table_exists(cursor, META_TABLE):
+        return {}
+    cursor.execute(f"SELECT key, value FROM {META_TABLE}")
+    return dict(cursor.fetchall())
+
+
+def _write_meta(cursor, meta):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)"
+    )
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES (?, ?)",
+        list(meta.items()),
+    )
+
+
+def _bump_data_version(cursor, stored):
+    version = int(stored.get("data_version") or 0) + 1
+    _write_meta(cursor, {"data_version": str(version)})
+    return version
+
+
+def _sources_match(stored, expected):
+    return all(
+        stored.get(key) == value
+        for key, value in expected.items()
+        if key.startswith("source:")
+    )
+
+
+def _meta_is_current(stored, expected):
+    return all(stored.get(key) == value for key, value in expected.items())
+
+
+def _migrate_typed_columns(cursor):
+    select_sql = ", ".join(
+        [
+            "CAST(order_id AS INTEGER)",
+            "customer_id",
+            "product",
+            "region",
+            "channel",
+            "order_date",
+            "CAST(year AS INTEGER)",
+            "CAST(revenue AS NUMERIC)",
+            "CASE WHEN date(order_date) IS NOT NULL "
+            "THEN CAST(substr(order_date, 6, 2) AS INTEGER) END",
+            "CASE WHEN date(order_date) IS NOT NULL "
+            "THEN CAST(substr(order_date, 1, 4) || substr(order_date, 6, 2) "
+            "AS INTEGER) END",
+        ]
+    )
+    columns = ", ".join(COLUMNS + ["month", "year_month"])
+    cursor.execute(f"DROP VIEW IF EXISTS {ALL_VIEW}")
+    for table_name in YEAR_TABLES.values():
+        staging = f"{table_name}_migrating"
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        _create_table(cursor, staging)
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {staging} ({columns}) "
+            f"SELECT {select_sql} FROM {table_name}"
+        )
+        cursor.execute(f"DROP TABLE {table_name}")
+        cursor.execute(f"ALTER TABLE {staging} RENAME TO {table_name}")
+        _create_indexes(cursor, table_name)
+    _create_view(cursor)
+
+
+def _rollup_select(dimensions, where=""):
+    dimension_sql = ", ".join(dimensions)
+    measure_sql = ", ".join(
+        f"{sql} AS {measure}" for measure, sql in ROLLUP_MEASURES.items()
+    )
+    return (
+        f"SELECT {dimension_sql}, {measure_sql} "
+        f"FROM {ALL_VIEW}{where} GROUP BY {dimension_sql}"
+    )
+
+
+def _build_rollups(cursor):
+    for name, dimensions in ROLLUPS.items():
+        cursor.execute(f"DROP TABLE IF EXISTS {name}")
+        cursor.execute(f"CREATE TABLE {name} AS {_rollup_select(dimensions)}")
+        cursor.execute(
+            f"CREATE INDEX idx_{name}_year ON {name} (year, month_index)"
+        )
+
+
+def _refresh_rollups(cursor, month_indexes):
+    # Every rollup groups by month_index, so only the groups for the months
+    # that changed need to be recomputed.
+    months = sorted(index for index in month_indexes if index is not None)
+    clauses = []
+    if months:
+        clauses.append(f"month_index IN ({', '.join('?' for _ in months)})")
+    if None in month_indexes:
+        clauses.append("month_index IS NULL")
+    if not clauses:
+        return
+    where = " WHERE " + " OR ".join(clauses)
+    for name, dimensions in ROLLUPS.items():
+        cursor.execute(f"DELETE FROM {name}{where}", months)
+        cursor.execute(
+            f"INSERT INTO {name} {_rollup_select(dimensions, where)}", months
+        )
+
+
+def _build_partition_stats(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {PARTITION_TABLE}")
+    cursor.execute(
+        f"CREATE TABLE {PARTITION_TABLE} (table_name TEXT PRIMARY KEY, "
+        "row_count INTEGER, min_order_date TEXT, max_order_date TEXT, "
+        "min_month_index INTEGER, max_month_index INTEGER, months TEXT)"
+    )
+    for table_name in YEAR_TABLES.values():
+        cursor.execute(
+            f"INSERT INTO {PARTITION_TABLE} SELECT ?, COUNT(*), "
+            "MIN(CASE WHEN month_index IS NOT NULL THEN order_date END), "
+            "MAX(CASE WHEN month_index IS NOT NULL THEN order_date END), "
+            "MIN(month_index), MAX(month_index), GROUP_CONCAT(DISTINCT month) "
+            f"FROM {table_name}",
+            (table_name,),
+        )
+
+
+def _build_value_index(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {VALUES_TABLE}")
+    cursor.execute(
+        f"CREATE TABLE {VALUES_TABLE} (dimension TEXT, value TEXT, "
+        "PRIMARY KEY (dimension, value)) WITHOUT ROWID"
+    )
+    for dimension in VALUE_DIMENSIONS:
+        cursor.execute(
+            f"INSERT OR IGNORE INTO {VALUES_TABLE} (dimension, value) "
+            f"SELECT ?, {dimension} FROM {ALL_VIEW} "
+            f"WHERE {dimension} IS NOT NULL GROUP BY {dimension}",
+            (dimension,),
+        )
+
+
+def _table_columns(cursor, table_name):
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _migrate_month_index(cursor):
+    cursor.execute(f"DROP VIEW IF EXISTS {ALL_VIEW}")
+    for table_name in YEAR_TABLES.values():
+        if "month_index" not in _table_columns(cursor, table_name):
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN month_index INTEGER")
+        cursor.execute(
+            f"UPDATE {table_name} "
+            "SET month_index = (year_month / 100) * 12 + year_month % 100"
+        )
+        for suffix in ["year_month", "region", "product", "channel"]:
+            cursor.execute(f"DROP INDEX IF EXISTS idx_{table_name}_{suffix}")
+        _create_indexes(cursor, table_name)
+    _create_view(cursor)
+
+
+MIGRATIONS = {
+    1: _migrate_typed_columns,
+    2: _migrate_month_index,
+    3: _build_rollups,
+    4: _build_partition_stats,
+    5: _build_value_index,
+}
+
+
+def _can_migrate(stored, expected):
+    try:
+        version = int(stored.get("schema_version") or 0)
+    except ValueError:
+        return False
+    if not version or not _sources_match(stored, expected):
+        return False
+    return all(step in MIGRATIONS for step in range(version, SCHEMA_VERSION))
+
+
+def _migrate(cursor, stored, expected):
+    if not _can_migrate(stored, expected):
+        return False
+    for step in range(int(stored["schema_version"]), SCHEMA_VERSION):
+        MIGRATIONS[step](cursor)
+    return True
+
+
+def _source_groups():
+    # Years without their own file share all.csv, which is read once and
+    # fanned out to every year table it feeds.
+    groups = {}
+    for year, table_name in YEAR_TABLES.items():
+        groups.setdefault(_source_path(year), {})[year] = table_name
+    return groups
+
+
+def _ingest_source(cursor, path, tables, chunk_size, offset=0, insert=_insert_rows):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"CSV source not found at {path}")
+    fan_out = path == ALL_CSV
+    buffers = {table_name: [] for table_name in tables.values()}
+    for row in _iter_source_rows(path, offset):
+        if fan_out:
+            table_name = tables.get(row.get("year"))
+            if table_name is None:
+                continue
+        else:
+            (table_name,) = tables.values()
+        buffer = buffers[table_name]
+        buffer.append(_row_values(row))
+        if len(buffer) >= chunk_size:
+            insert(cursor, table_name, buffer)
+            buffer.clear()
+    for table_name, buffer in buffers.items():
+        insert(cursor, table_name, buffer)
+
+
+def _source_digests(path, prefix_size=None):
+    # One pass yields the digest of the previously loaded prefix and of the
+    # whole file, so an append can be verified and recorded together.
+    digest = hashlib.sha256()
+    prefix = None
+    with open(path, "rb") as handle:
+        if prefix_size is not None:
+            remaining = prefix_size
+            while remaining > 0:
+                block = handle.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+            prefix = digest.hexdigest()
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return prefix, digest.hexdigest()
+
+
+def _write_digests(cursor, tables, digest):
+    _write_meta(cursor, {f"digest:{year}": digest for year in tables})
+
+
+def _loaded_size(stored, year):
+    # Fingerprints are "<file>:<size>:<mtime_ns>".
+    parts = (stored.get(f"source:{year}") or "").rsplit(":", 2)
+    return int(parts[1]) if len(parts) == 3 and parts[1].isdigit() else None
+
+
+def _ends_line(path, offset):
+    if offset == 0:
+        return True
+    with open(path, "rb") as handle:
+        handle.seek(offset - 1)
+        return handle.read(1) == b"\n"
+
+
+def _upsert_rows(cursor, table_name, values, high_water, touched):
+    # Rows past the high-water mark are new orders; the rest may replace an
+    # existing order, whose old month has to be refreshed in the rollups too.
+    corrections = []
+    for row in values:
+        touched.add(row[-1])
+        try:
+            order_id = int(row[0])
+        except (TypeError, ValueError):
+            continue
+        if order_id <= high_water:
+            corrections.append(order_id)
+    for start in range(0, len(corrections), 500):
+        chunk = corrections[start:start + 500]
+        cursor.execute(
+            f"SELECT month_index FROM {table_name} WHERE {PRIMARY_KEY} IN "
+            f"({', '.join('?' for _ in chunk)})",
+            chunk,
+        )
+        touched.update(row[0] for row in cursor.fetchall())
+    _insert_rows(cursor, table_name, values)
+
+
+def _changed_groups(stored, expected):
+    return {
+        path: tables
+        for path, tables in _source_groups().items()
+        if any(
+            stored.get(f"source:{year}") != expected[f"source:{year}"]
+            for year in tables
+        )
+    }
+
+
+def _can_refresh(stored, expected):
+    if stored.get("schema_version") != str(SCHEMA_VERSION):
+        return False
+    for path, tables in _changed_groups(stored, expected).items():
+        for year in tables:
+            previous = (stored.get(f"source:{year}") or "").split(":", 1)[0]
+            if previous != os.path.basename(path):
+                return False
+            if not stored.get(f"digest:{year}") or _loaded_size(stored, year) is None:
+                return False
+    return True
+
+
+def _refresh(cursor, stored, expected, chunk_size):
+    if not _can_refresh(stored, expected):
+        return False
+
+    touched = set()
+    reloaded = False
+    for path, tables in _changed_groups(stored, expected).items():
+        sizes = {_loaded_size(stored, year) for year in tables}
+        digests = {stored[f"digest:{year}"] for year in tables}
+        offset = sizes.pop() if len(sizes) == 1 else 0
+        prefix, digest = _source_digests(path, offset)
+        appended = (
+            path.endswith(".csv")
+            and len(digests) == 1
+            and prefix == digests.pop()
+            and _ends_line(path, offset)
+        )
+
+        if appended:
+            high_water = {}
+            for table_name in tables.values():
+                cursor.execute(f"SELECT MAX({PRIMARY_KEY}) FROM {table_name}")
+                high_water[table_name] = cursor.fetchone()[0] or 0
+
+            def upsert(cursor, table_name, values):
+                if values:
+                    _upsert_rows(
+                        cursor, table_name, values, high_water[table_name], touched
+                    )
+
+            _ingest_source(cursor, path, tables, chunk_size, offset, insert=upsert)
+        else:
+            # Rows were edited or removed in place; reload these partitions.
+            for table_name in tables.values():
+                cursor.execute(f"DELETE FROM {table_name}")
+            _ingest_source(cursor, path, tables, chunk_size)
+            reloaded = True
+        _write_digests(cursor, tables, digest)
+
+    if reloaded:
+        _build_rollups(cursor)
+    else:
+        _refresh_rollups(cursor, touched)
+    _build_partition_stats(cursor)
+    _build_value_index(cursor)
+    return True
+
+
+def _stage_source(path, tables, staging_path, chunk_size):
+    # Staging files are thrown away after the merge, so they skip the journal.
+    connection = sqlite3.connect(staging_path, isolation_level=None)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode = OFF")
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("BEGIN")
+        for table_name in tables.values():
+            _create_table(cursor, table_name)
+        _ingest_source(cursor, path, tables, chunk_size)
+        cursor.execute("COMMIT")
+    finally:
+        connection.close()
+    return staging_path
+
+
+def _stage_sources(cursor, staging_dir, workers, chunk_size):
+    groups = list(_source_groups().items())
+    with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+        futures = [
+            pool.submit(
+                _stage_source,
+                path,
+                tables,
+                os.path.join(staging_dir, f"stage_{index}.db"),
+                chunk_size,
+            )
+            for index, (path, tables) in enumerate(groups)
+        ]
+        staged = {}
+        for index, (future, (_, tables)) in enumerate(zip(futures, groups)):
+            schema = f"stage_{index}"
+            # ATTACH is not allowed inside a transaction, so staging databases
+            # are attached before bootstrap takes its write lock.
+            cursor.execute(f"ATTACH DATABASE ? AS {schema}", (future.result(),))
+            staged[schema] = tables
+    return staged
+
+
+def _build(cursor, staged=None, chunk_size=INGEST_CHUNK_SIZE):
+    # Staging databases are attached with tables of the same names, so every
+    # statement here names main explicitly; otherwise a fresh database would
+    # drop the staged copies instead.
+    cursor.execute(f"DROP VIEW IF EXISTS main.{ALL_VIEW}")
+    for table_name in YEAR_TABLES.values():
+        cursor.execute(f"DROP TABLE IF EXISTS main.{table_name}")
+        _create_table(cursor, table_name)
+
+    if staged:
+        for schema, tables in staged.items():
+            for table_name in tables.values():
+                cursor.execute(
+                    f"INSERT OR REPLACE INTO main.{table_name} "
+                    f"SELECT * FROM {schema}.{table_name}"
+                )
     else:
-        all_csv = os.path.join(DATA_DIR, "all.csv")
-        if not os.path.exists(all_csv):
-            raise FileNotFoundError(f"CSV source not found at {all_csv}")
-        rows = [row for row in _read_csv_rows(all_csv) if row.get("year") == year]
+        for path, tables in _source_groups().items():
+            _ingest_source(cursor, path, tables, chunk_size)
+    for path, tables in _source_groups().items():
+        _write_digests(cursor, tables, _source_digests(path)[1])
 
-    _insert_rows(cursor, table_name, rows)
+    # Indexes are built once over the loaded rows rather than per insert.
+    for table_name in YEAR_TABLES.values():
+        _create_indexes(cursor, table_name)
+    _create_view(cursor)
+    _build_rollups(cursor)
+    _build_partition_stats(cursor)
+    _build_value_index(cursor)
 
 
-def _ensure_db():
+def bootstrap(force=False, workers=None, chunk_size=None):
+    workers = workers or INGEST_WORKERS
+    chunk_size = chunk_size or INGEST_CHUNK_SIZE
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    connection = sqlite3.connect(DB_PATH)
+    expected = _expected_meta()
+    connection = sqlite3.connect(DB_PATH, isolation_level=None)
+    staging_dir = None
     try:
         cursor = connection.cursor()
-        for year, table_name in YEAR_TABLES.items():
-            _ensure_year_table(cursor, year, table_name)
+        cursor.execute("PRAGMA journal_mode = WAL")
+        stored = _read_meta(cursor)
+        if not force and _meta_is_current(stored, expected):
+            return False
 
-        cursor.execute(f"DROP VIEW IF EXISTS {ALL_VIEW}")
-        union_sql = " UNION ALL ".join(
-            f"SELECT * FROM {table_name}" for table_name in YEAR_TABLES.values()
-        )
-        cursor.execute(f"CREATE VIEW {ALL_VIEW} AS {union_sql}")
-        connection.commit()
+        staged = None
+        full_load = not (_can_migrate(stored, expected) or _can_refresh(stored, expected))
+        if force or full_load:
+            # A full load is derived entirely from the CSVs, so it skips fsyncs;
+            # after a crash, rerun with --force to rebuild from the sources.
+            cursor.execute("PRAGMA synchronous = OFF")
+            if workers > 1:
+                staging_dir = tempfile.mkdtemp(dir=os.path.dirname(DB_PATH))
+                staged = _stage_sources(cursor, staging_dir, workers, chunk_size)
+
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            stored = _read_meta(cursor)
+            if not force and _meta_is_current(stored, expected):
+                cursor.execute("COMMIT")
+                return False
+            if force:
+                _build(cursor, staged, chunk_size)
+                cursor.execute("ANALYZE")
+            elif _migrate(cursor, stored, expected):
+                cursor.execute("ANALYZE")
+            elif _refresh(cursor, stored, expected, chunk_size):
+                cursor.execute("PRAGMA optimize")
+            else:
+                _build(cursor, staged, chunk_size)
+                cursor.execute("ANALYZE")
+            _write_meta(cursor, expected)
+            _bump_data_version(cursor, stored)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        return True
     finally:
         connection.close()
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
 
 
-def _select_table(filters):
-    if not filters:
-        return ALL_VIEW
+def ensure_bootstrapped():
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if not _bootstrapped:
+            bootstrap()
+            _bootstrapped = True
+
+
+def _read_partition_stats():
+    stats = {}
+    for row in fetch(f"SELECT * FROM {PARTITION_TABLE}"):
+        months = row["months"].split(",") if row["months"] else []
+        stats[row["table_name"]] = {
+            "rows": row["row_count"],
+            "min_date": row["min_order_date"],
+            "max_date": row["max_order_date"],
+            "min_index": row["min_month_index"],
+            "max_index": row["max_month_index"],
+            "months": {int(month) for month in months},
+        }
+    return stats
+
+
+def partition_stats():
+    global _partition_stats
+    version = data_version()
+    if _partition_stats is None or _partition_stats[0] != version:
+        with _stats_lock:
+            if _partition_stats is None or _partition_stats[0] != version:
+                _partition_stats = (version, _read_partition_stats())
+    return _partition_stats[1]
+
+
+def _filter_months(filters):
+    month = filters.get("month")
+    if month:
+        return {int(month)}
+    month_start = filters.get("month_start")
+    month_end = filters.get("month_end")
+    if month_start and month_end:
+        return set(range(int(month_start), int(month_end) + 1))
+    return None
+
+
+def _year_partitions(filters):
     year = filters.get("year")
-    if isinstance(year, (list, tuple)):
+    if not year:
+        return list(YEAR_TABLES.values())
+    years = year if isinstance(year, (list, tuple)) else [year]
+    years = {str(item) for item in years}
+    return [YEAR_TABLES[key] for key in YEAR_TABLES if key in years]
+
+
+def resolve_window(filters):
+    # With no other filters a "last N months" window ends at the newest month
+    # across the candidate partitions, which the metadata already knows. The
+    # window is swapped for a fixed month_index range so no query has to find
+    # the anchor first.
+    filters = filters or {}
+    last_months = filters.get("last_months")
+    if not last_months or not set(filters) <= PARTITION_FILTER_KEYS:
+        return filters
+    stats = partition_stats()
+    highs = [stats[name]["max_index"] for name in _year_partitions(filters)]
+    highs = [high for high in highs if high is not None]
+    if not highs:
+        return filters
+    anchor = max(highs)
+    resolved = {key: value for key, value in filters.items() if key != "last_months"}
+    resolved["month_index_start"] = anchor - (int(last_months) - 1)
+    resolved["month_index_end"] = anchor
+    return resolved
+
+
+def prune_partitions(filters):
+    filters = filters or {}
+    tables = _year_partitions(filters)
+
+    months = _filter_months(filters)
+    index_start = filters.get("month_index_start")
+    index_end = filters.get("month_index_end")
+    if months is None and index_start is None:
+        return tables
+    stats = partition_stats()
+
+    if months is not None:
+        tables = [name for name in tables if stats[name]["months"] & months]
+    if index_start is not None:
+        tables = [
+            name
+            for name in tables
+            if stats[name]["max_index"] is not None
+            and stats[name]["max_index"] >= index_start
+            and stats[name]["min_index"] <= index_end
+        ]
+    return tables
+
+
+def partition_source(tables):
+    # Nothing survives only when the filters match no rows at all; the full
+    # view still returns the right (empty) answer through the WHERE clause.
+    if not tables or len(tables) == len(YEAR_TABLES):
         return ALL_VIEW
-    if year and year in YEAR_TABLES:
-        return YEAR_TABLES[year]
-    return ALL_VIEW
+    if len(tables) == 1:
+        return tables[0]
+    union_sql = " UNION ALL ".join(f"SELECT * FROM {name}" for name in tables)
+    return f"({union_sql})"
+
+
+def select_table(filters):
+    return partition_source(prune_partitions(filters))
+
+
+def load(filters=None, columns=None):
+    table = select_table(filters or {})
+    columns = ", ".join(columns or COLUMNS)
+    sql = f"SELECT {columns} FROM {table} ORDER BY {PRIMARY_KEY}"
+    return [dict(row) for row in fetch(sql)]
 
 
-def load(filters=None):
-    _ensure_db()
-    table = _select_table(filters or {})
-    connection = sqlite3.connect(DB_PATH)
-    connection.row_factory = sqlite3.Row
+def dimension_values():
+    values = {dimension: [] for dimension in VALUE_DIMENSIONS}
+    for row in fetch(f"SELECT dimension, value FROM {VALUES_TABLE}"):
+        values.setdefault(row[0], []).append(row[1])
+    return values
+
+
+def data_version():
+    rows = fetch(f"SELECT value FROM {META_TABLE} WHERE key = 'data_version'")
+    return rows[0][0] if rows else None
+
+
+def fetch(sql, params=()):
+    ensure_bootstrapped()
+    cursor = get_connection(DB_PATH).execute(sql, params)
     try:
-        cursor = connection.cursor()
-        cursor.execute(f"SELECT * FROM {table}")
-        return [dict(row) for row in cursor.fetchall()]
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def iter_rows(sql, params=(), chunk_size=1000):
+    # Streams run on a dedicated connection: a response generator may be
+    # resumed on different threads, so it cannot borrow a pooled one.
+    ensure_bootstrapped()
+    connection = open_connection(DB_PATH)
+    try:
+        cursor = connection.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
     finally:
         connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or migrate the sales database.")
+    parser.add_argument(
+        "--force", action="store_true", help="rebuild even if the schema is current"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=INGEST_WORKERS,
+        help="processes parsing source files in parallel",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=INGEST_CHUNK_SIZE,
+        help="rows inserted per batch",
+    )
+    args = parser.parse_args()
+    if bootstrap(force=args.force, workers=args.workers, chunk_size=args.chunk_size):
+        print(f"Built {DB_PATH} (schema version {SCHEMA_VERSION})")
+    else:
+        print(f"{DB_PATH} is up to date (schema version {SCHEMA_VERSION})")
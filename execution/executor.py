@@ -1,6 +1,54 @@
-from datetime import datetime
+import json
+import os
 
-from .data_loader import load
+from core.planner import plan_key
+from utils.cache import MISSING, create_cache
+from utils.metrics import count as record_metric
+
+from . import arrow_backend, columnar
+from .data_loader import (
+    COLUMNS,
+    DERIVED_COLUMNS,
+    NUMERIC_COLUMNS,
+    PRIMARY_KEY,
+    data_version,
+    fetch,
+    iter_rows,
+    load,
+    partition_source,
+    partition_stats,
+    prune_partitions,
+    resolve_window,
+)
+from .sql_compiler import (
+    MONTH_FILTER_KEYS,
+    UnsupportedPlan,
+    compile_aggregates,
+    compile_count,
+    compile_first,
+    compile_group_max,
+    compile_list,
+    compile_sum,
+    select_rollup,
+)
+
+# "sql" pushes plans into SQLite, "columnar" answers them from in-memory
+# NumPy arrays, "arrow" scans Parquet/Arrow partition files and "rows"
+# filters dicts in Python. Plans a backend cannot express fall back to "rows".
+EXECUTION_BACKEND = os.environ.get("EXECUTION_BACKEND", "sql")
+
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "0")) or None
+RESULT_CACHE_PATH = os.environ.get("RESULT_CACHE_PATH")
+# Row listings can be arbitrarily large, so only aggregate answers are cached.
+UNCACHED_INTENTS = {"LIST"}
+
+result_cache = create_cache(
+    RESULT_CACHE_SIZE,
+    ttl=RESULT_CACHE_TTL,
+    path=RESULT_CACHE_PATH,
+    table="result_cache",
+)
 
 
 def _to_number(value):
@@ -19,38 +67,28 @@ def _sum_rows(rows, metric):
     return total
 
 
-def _parse_order_date(row):
-    date_str = row.get("order_date")
-    if not date_str:
-        return None
-    try:
-        return datetime.strptime(date_str, "%Y-%m-%d")
-    except ValueError:
-        return None
-
-
 def _apply_month_filter(rows, filters):
     month = filters.get("month")
     month_start = filters.get("month_start")
     month_end = filters.get("month_end")
 
-    if not month and not (month_start and month_end):
-        return rows
+    if month:
+        month = int(month)
+        rows = [row for row in rows if row.get("month") == month]
+    elif month_start and month_end:
+        low, high = int(month_start), int(month_end)
+        rows = [row for row in rows if row.get("month") and low <= row["month"] <= high]
 
-    filtered = []
-    for row in rows:
-        date_value = _parse_order_date(row)
-        if not date_value:
-            continue
-        row_month = date_value.month
-        if month:
-            if row_month != int(month):
-                continue
-        else:
-            if row_month < int(month_start) or row_month > int(month_end):
-                continue
-        filtered.append(row)
-    return filtered
+    index_start = filters.get("month_index_start")
+    index_end = filters.get("month_index_end")
+    if index_start is not None and index_end is not None:
+        low, high = int(index_start), int(index_end)
+        rows = [
+            row
+            for row in rows
+            if row.get("month_index") and low <= row["month_index"] <= high
+        ]
+    return rows
 
 
 def _apply_relative_month_filter(rows, filters):
@@ -58,36 +96,24 @@ def _apply_relative_month_filter(rows, filters):
     if not last_months:
         return rows
 
-    dated_rows = []
-    for row in rows:
-        date_value = _parse_order_date(row)
-        if date_value:
-            dated_rows.append((row, date_value))
-
+    dated_rows = [row for row in rows if row.get("month_index")]
     if not dated_rows:
         return rows
 
-    max_date = max(date for _, date in dated_rows)
-    max_index = max_date.year * 12 + max_date.month
+    max_index = max(row["month_index"] for row in dated_rows)
     threshold = max_index - (int(last_months) - 1)
-
-    filtered = []
-    for row, date_value in dated_rows:
-        row_index = date_value.year * 12 + date_value.month
-        if row_index >= threshold:
-            filtered.append(row)
-    return filtered
+    return [row for row in dated_rows if row["month_index"] >= threshold]
 
 
 def _apply_filters(rows, filters):
     for key, value in filters.items():
-        if key in {"month", "month_start", "month_end", "last_months"}:
+        if key in MONTH_FILTER_KEYS:
             continue
         if isinstance(value, (list, tuple)):
             allowed = {str(item) for item in value}
             rows = [row for row in rows if str(row.get(key)) in allowed]
         else:
-            rows = [row for row in rows if row.get(key) == value]
+            rows = [row for row in rows if str(row.get(key)) == str(value)]
 
     rows = _apply_month_filter(rows, filters)
     return _apply_relative_month_filter(rows, filters)
@@ -104,13 +130,7 @@ def _metric_is_numeric(rows, metric):
 def _group_aggregate(rows, group_by, metric, aggregation):
     grouped = {}
     for row in rows:
-        if group_by == "month":
-            date_value = _parse_order_date(row)
-            if not date_value:
-                continue
-            key = date_value.month
-        else:
-            key = row.get(group_by)
+        key = row.get(group_by)
         if key is None:
             continue
         if aggregation == "count":
@@ -123,9 +143,50 @@ def _group_aggregate(rows, group_by, metric, aggregation):
     return grouped
 
 
-def execute(plan):
-    data = load(plan.get("filters"))
-    filters = plan.get("filters") or {}
+def _max_result(group_by, metric, basis, key, value):
+    return {
+        "aggregation": "max",
+        "group_by": group_by,
+        "metric": metric,
+        "value": value,
+        "key": key,
+        "basis": basis,
+    }
+
+
+def _sum_result(metric, total):
+    return {"aggregation": "sum", "metric": metric, "value": total}
+
+
+def _page(rows, limit, after):
+    if after is not None:
+        rows = [row for row in rows if _to_number(row.get(PRIMARY_KEY)) > after]
+    if limit is not None:
+        rows = rows[:limit]
+    return [{col: row.get(col) for col in COLUMNS} for row in rows]
+
+
+def _record_scan(tables):
+    # Counts whole partitions: SQLite does not report how many rows an
+    # indexed query actually visited. No surviving partition means the full
+    # view is read.
+    stats = partition_stats()
+    tables = tables or list(stats)
+    record_metric("partitions_touched", len(tables))
+    record_metric("rows_scanned", sum(stats[name]["rows"] for name in tables))
+
+
+def _record_result(plan, result):
+    if plan.get("intent") == "LIST":
+        record_metric("rows_returned", len(result or ()))
+    elif result is not None:
+        record_metric("rows_returned")
+
+
+def _execute_rows(plan, limit=None, after=None):
+    filters = resolve_window(plan.get("filters"))
+    data = load(filters, COLUMNS + DERIVED_COLUMNS)
+    _record_scan(prune_partitions(filters))
     rows = _apply_filters(data, filters)
 
     intent = plan.get("intent")
@@ -134,7 +195,7 @@ def execute(plan):
     group_by = plan.get("group_by")
 
     if intent == "LIST":
-        return rows
+        return _page(rows, limit, after)
     if intent == "COUNT":
         return len(rows)
     if intent == "AGG_MAX":
@@ -154,14 +215,7 @@ def execute(plan):
         if not grouped:
             return None
         max_key = max(grouped, key=grouped.get)
-        return {
-            "aggregation": "max",
-            "group_by": group_by,
-            "metric": metric,
-            "value": grouped[max_key],
-            "key": max_key,
-            "basis": basis,
-        }
+        return _max_result(group_by, metric, basis, max_key, grouped[max_key])
     if intent == "READ":
         if not rows:
             return None
@@ -169,7 +223,226 @@ def execute(plan):
             return None
         if aggregation == "sum":
             total = _sum_rows(rows, metric)
-            return {"aggregation": "sum", "metric": metric, "value": total}
+            return _sum_result(metric, total)
         return rows[0].get(metric)
 
     return None
+
+
+def _max_spec(plan):
+    group_by = plan.get("group_by") or "year"
+    metric = plan.get("metric") or "revenue"
+    if metric not in NUMERIC_COLUMNS:
+        metric = "revenue"
+    basis = "count" if metric == "order_id" else "sum"
+    return group_by, metric, basis
+
+
+def _base_source(filters):
+    tables = prune_partitions(filters)
+    _record_scan(tables)
+    return partition_source(tables)
+
+
+def _aggregate_source(filters, metrics=(), group_by=None):
+    return select_rollup(filters, metrics, group_by) or _base_source(filters)
+
+
+def _execute_sql(plan, limit=None, after=None):
+    filters = resolve_window(plan.get("filters"))
+
+    intent = plan.get("intent")
+    metric = plan.get("metric")
+    aggregation = plan.get("aggregation")
+
+    if intent == "LIST":
+        sql, params = compile_list(
+            _base_source(filters), filters, limit=limit, after=after
+        )
+        return [dict(row) for row in fetch(sql, params)]
+    if intent == "COUNT":
+        sql, params = compile_count(_aggregate_source(filters), filters)
+        return fetch(sql, params)[0][0]
+    if intent == "AGG_MAX":
+        group_by, metric, basis = _max_spec(plan)
+        metrics = [] if basis == "count" else [metric]
+        source = _aggregate_source(filters, metrics, group_by)
+        sql, params = compile_group_max(source, filters, group_by, metric, basis)
+        rows = fetch(sql, params)
+        if not rows:
+            return None
+        return _max_result(group_by, metric, basis, rows[0]["key"], rows[0]["value"])
+    if intent == "READ":
+        if not metric:
+            return None
+        if aggregation == "sum":
+            source = _aggregate_source(filters, [metric])
+            sql, params = compile_sum(source, filters, metric)
+            count, total = fetch(sql, params)[0]
+            if not count:
+                return None
+            return _sum_result(metric, total)
+        sql, params = compile_first(_base_source(filters), filters, metric)
+        rows = fetch(sql, params)
+        return rows[0][metric] if rows else None
+
+    return None
+
+
+def _execute_store(store, plan, limit=None, after=None):
+    filters = resolve_window(plan.get("filters"))
+    tables = prune_partitions(filters)
+    _record_scan(tables)
+
+    intent = plan.get("intent")
+    metric = plan.get("metric")
+    aggregation = plan.get("aggregation")
+
+    if intent == "LIST":
+        return store.list_rows(tables, filters, limit=limit, after=after)
+    if intent == "COUNT":
+        return store.count(tables, filters)
+    if intent == "AGG_MAX":
+        group_by, metric, basis = _max_spec(plan)
+        best = store.group_max(tables, filters, group_by, metric, basis)
+        if best is None:
+            return None
+        return _max_result(group_by, metric, basis, *best)
+    if intent == "READ":
+        if not metric:
+            return None
+        if aggregation == "sum":
+            count, total = store.total(tables, filters, metric)
+            if not count:
+                return None
+            return _sum_result(metric, total)
+        return store.first(tables, filters, metric)
+
+    return None
+
+
+def _execute_columnar(plan, limit=None, after=None):
+    return _execute_store(columnar, plan, limit=limit, after=after)
+
+
+def _execute_arrow(plan, limit=None, after=None):
+    return _execute_store(arrow_backend, plan, limit=limit, after=after)
+
+
+BACKENDS = {
+    "sql": _execute_sql,
+    "columnar": _execute_columnar,
+    "arrow": _execute_arrow,
+    "rows": _execute_rows,
+}
+
+
+def _execute(plan, limit=None, after=None, backend=None):
+    run = BACKENDS[backend or EXECUTION_BACKEND]
+    try:
+        return run(plan, limit=limit, after=after)
+    except UnsupportedPlan:
+        return _execute_rows(plan, limit=limit, after=after)
+
+
+def _cache_key(version, plan):
+    if plan.get("intent") in UNCACHED_INTENTS:
+        return None
+    return json.dumps([version, plan_key(plan)])
+
+
+def execute(plan, limit=None, after=None, backend=None):
+    key = _cache_key(data_version(), plan)
+    if key is not None:
+        cached = result_cache.get(key)
+        if cached is not MISSING:
+            record_metric("cache_hits", cache="result")
+            _record_result(plan, cached)
+            return cached
+        record_metric("cache_misses", cache="result")
+
+    result = _execute(plan, limit=limit, after=after, backend=backend)
+    if key is not None:
+        result_cache.set(key, result)
+    _record_result(plan, result)
+    return result
+
+
+def _is_scalar_aggregate(plan):
+    if plan.get("intent") == "COUNT":
+        return True
+    return (
+        plan.get("intent") == "READ"
+        and plan.get("aggregation") == "sum"
+        and plan.get("metric") in NUMERIC_COLUMNS
+    )
+
+
+def _execute_scalar_group(plans):
+    filters = resolve_window(plans[0].get("filters"))
+    metrics = sorted({p["metric"] for p in plans if p.get("intent") == "READ"})
+    source = _aggregate_source(filters, metrics)
+    sql, params = compile_aggregates(source, filters, metrics)
+    row = fetch(sql, params)[0]
+    count = row[0]
+    totals = dict(zip(metrics, row[1:]))
+
+    results = []
+    for plan in plans:
+        if plan.get("intent") == "COUNT":
+            results.append(count)
+        elif not count:
+            results.append(None)
+        else:
+            results.append(_sum_result(plan["metric"], totals[plan["metric"]]))
+    return results
+
+
+def stream_rows(plan, chunk_size=1000):
+    filters = resolve_window(plan.get("filters"))
+    try:
+        sql, params = compile_list(_base_source(filters), filters)
+    except UnsupportedPlan:
+        yield from _execute_rows(dict(plan, intent="LIST"))
+        return
+    yield from iter_rows(sql, params, chunk_size=chunk_size)
+
+
+def execute_many(plans, limit=None):
+    version = data_version()
+    results = {}
+    scalar_groups = {}
+    for plan in plans:
+        key = plan_key(plan)
+        if key in results:
+            continue
+        cache_key = _cache_key(version, plan)
+        if cache_key is not None:
+            cached = result_cache.get(cache_key)
+            if cached is not MISSING:
+                record_metric("cache_hits", cache="result")
+                results[key] = cached
+                continue
+            record_metric("cache_misses", cache="result")
+        if EXECUTION_BACKEND == "sql" and _is_scalar_aggregate(plan):
+            filters_key = key[2]
+            scalar_groups.setdefault(filters_key, {})[key] = plan
+        else:
+            results[key] = _execute(plan, limit=limit)
+            if cache_key is not None:
+                result_cache.set(cache_key, results[key])
+
+    for group in scalar_groups.values():
+        group_plans = list(group.values())
+        try:
+            group_results = _execute_scalar_group(group_plans)
+        except UnsupportedPlan:
+            group_results = [_execute(plan) for plan in group_plans]
+        for plan, result in zip(group_plans, group_results):
+            results[plan_key(plan)] = result
+            result_cache.set(_cache_key(version, plan), result)
+
+    answers = [results[plan_key(plan)] for plan in plans]
+    for plan, result in zip(plans, answers):
+        _record_result(plan, result)
+    return answers
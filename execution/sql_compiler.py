@@ -0,0 +1,182 @@
+from .data_loader import COLUMNS, NUMERIC_COLUMNS, PRIMARY_KEY, ROLLUPS
+
+MONTH_FILTER_KEYS = {
+    "month",
+    "month_start",
+    "month_end",
+    "last_months",
+    "month_index_start",
+    "month_index_end",
+}
+FILTER_DIMENSIONS = {
+    "month": "month",
+    "month_start": "month",
+    "month_end": "month",
+    "last_months": "month_index",
+    "month_index_start": "month_index",
+    "month_index_end": "month_index",
+}
+
+# Year is a rollup dimension, so its sum is recoverable from the counts.
+ROLLUP_TOTALS = {
+    "revenue": "TOTAL(revenue_sum)",
+    "year": "TOTAL(year * order_count)",
+}
+ROLLUP_COUNT = "COALESCE(SUM(order_count), 0)"
+
+
+class UnsupportedPlan(ValueError):
+    pass
+
+
+def _column(name):
+    if name not in COLUMNS:
+        raise UnsupportedPlan(f"Unknown column: {name}")
+    return name
+
+
+def _numeric_column(name):
+    if name not in NUMERIC_COLUMNS:
+        raise UnsupportedPlan(f"Column is not numeric: {name}")
+    return name
+
+
+def _count_sql(table):
+    return ROLLUP_COUNT if table in ROLLUPS else "COUNT(*)"
+
+
+def _total_sql(table, metric):
+    if table not in ROLLUPS:
+        return f"TOTAL({_numeric_column(metric)})"
+    if metric not in ROLLUP_TOTALS:
+        raise UnsupportedPlan(f"{table} has no total for {metric}")
+    return ROLLUP_TOTALS[metric]
+
+
+def select_rollup(filters, metrics=(), group_by=None):
+    if any(metric not in ROLLUP_TOTALS for metric in metrics):
+        return None
+    needed = {FILTER_DIMENSIONS.get(key, key) for key in filters or {}}
+    if group_by:
+        needed.add(group_by)
+    for name, dimensions in ROLLUPS.items():
+        if needed <= set(dimensions):
+            return name
+    return None
+
+
+def _value_clauses(filters):
+    clauses = []
+    params = []
+    for key, value in filters.items():
+        if key in MONTH_FILTER_KEYS:
+            continue
+        column = _column(key)
+        if isinstance(value, (list, tuple)):
+            placeholders = ", ".join("?" for _ in value)
+            clauses.append(f"{column} IN ({placeholders})")
+            params.extend(value)
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    return clauses, params
+
+
+def _month_clauses(filters):
+    month = filters.get("month")
+    month_start = filters.get("month_start")
+    month_end = filters.get("month_end")
+
+    clauses = []
+    params = []
+    if month:
+        clauses.append("month = ?")
+        params.append(int(month))
+    elif month_start and month_end:
+        clauses.append("month BETWEEN ? AND ?")
+        params.extend([int(month_start), int(month_end)])
+
+    index_start = filters.get("month_index_start")
+    index_end = filters.get("month_index_end")
+    if index_start is not None and index_end is not None:
+        clauses.append("month_index BETWEEN ? AND ?")
+        params.extend([int(index_start), int(index_end)])
+    return clauses, params
+
+
+def _where(clauses):
+    if not clauses:
+        return ""
+    return " WHERE " + " AND ".join(clauses)
+
+
+def _and(where, clause):
+    return f"{where} AND {clause}" if where else f" WHERE {clause}"
+
+
+def compile_where(table, filters):
+    filters = filters or {}
+    clauses, params = _value_clauses(filters)
+    month_clauses, month_params = _month_clauses(filters)
+    clauses += month_clauses
+    params += month_params
+
+    last_months = filters.get("last_months")
+    if last_months:
+        anchor_sql = f"SELECT MAX(month_index) - ? FROM {table}{_where(clauses)}"
+        anchor_params = [int(last_months) - 1] + params
+        clauses = clauses + [f"month_index >= ({anchor_sql})"]
+        params = params + anchor_params
+
+    return _where(clauses), params
+
+
+def compile_list(table, filters, limit=None, after=None):
+    where, params = compile_where(table, filters)
+    if after is not None:
+        where = _and(where, f"{PRIMARY_KEY} > ?")
+        params.append(after)
+    sql = f"SELECT {', '.join(COLUMNS)} FROM {table}{where} ORDER BY {PRIMARY_KEY}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def compile_count(table, filters):
+    where, params = compile_where(table, filters)
+    return f"SELECT {_count_sql(table)} FROM {table}{where}", params
+
+
+def compile_sum(table, filters, metric):
+    return compile_aggregates(table, filters, [metric])
+
+
+def compile_aggregates(table, filters, metrics):
+    measures = [_count_sql(table)] + [_total_sql(table, metric) for metric in metrics]
+    where, params = compile_where(table, filters)
+    return f"SELECT {', '.join(measures)} FROM {table}{where}", params
+
+
+def compile_first(table, filters, metric):
+    column = _column(metric)
+    where, params = compile_where(table, filters)
+    sql = f"SELECT {column} FROM {table}{where} ORDER BY {PRIMARY_KEY} LIMIT 1"
+    return sql, params
+
+
+def compile_group_max(table, filters, group_by, metric, basis):
+    key_sql = "month" if group_by == "month" else _column(group_by)
+
+    if basis == "count":
+        value_sql = _count_sql(table)
+    else:
+        value_sql = _total_sql(table, metric)
+
+    where, params = compile_where(table, filters)
+    where = _and(where, f"{key_sql} IS NOT NULL")
+    sql = (
+        f"SELECT {key_sql} AS key, {value_sql} AS value FROM {table}{where} "
+        "GROUP BY key ORDER BY value DESC, key LIMIT 1"
+    )
+    return sql, params
@@ -65,10 +65,14 @@ def _format_filters(filters):
     return " " + " ".join(phrases)
 
 
-def format(metric, value, filters):
+def format(metric, value, filters, total=None, more=False):
     filter_text = _format_filters(filters)
 
     if isinstance(value, list):
+        if more:
+            return f"Showing a page of {len(value)} rows{filter_text}; more available."
+        if total is not None and total != len(value):
+            return f"Showing the last {len(value)} of {total} rows{filter_text}."
         return f"Showing {len(value)} rows{filter_text}."
 
     if isinstance(value, dict):
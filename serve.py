@@ -0,0 +1,133 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import uvicorn
+
+from core import fast_path
+from core.parser import get_tokenizer
+from engine import warm_up
+from execution import arrow_backend, columnar
+from execution.connection_pool import close_all
+from execution.data_loader import ensure_bootstrapped, partition_stats
+from execution.executor import EXECUTION_BACKEND
+from execution.sql_compiler import UnsupportedPlan
+from web_app import app
+
+SERVE_HOST = os.environ.get("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.environ.get("SERVE_PORT", "8000"))
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", str(os.cpu_count() or 1)))
+# A worker that exits sooner than this after starting is restarted only after
+# the same delay, so a broken worker cannot spin the master.
+RESPAWN_DELAY = 1.0
+
+
+def preload():
+    ensure_bootstrapped()
+    warm_up()
+    partition_stats()
+    if fast_path.ENABLED:
+        get_tokenizer()
+    try:
+        if EXECUTION_BACKEND == "columnar":
+            columnar.get_store()
+        elif EXECUTION_BACKEND == "arrow":
+            arrow_backend.get_partitions()
+    except UnsupportedPlan:
+        pass
+    # SQLite handles must not cross a fork; each worker opens its own.
+    close_all()
+
+
+def _listen(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker(sock, log_level):
+    gc.enable()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+    os._exit(0)
+
+
+def _spawn(sock, log_level):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _worker(sock, log_level)
+        except BaseException:
+            traceback.print_exc()
+        os._exit(1)
+    return pid
+
+
+def serve(host=SERVE_HOST, port=SERVE_PORT, workers=SERVE_WORKERS, log_level="info"):
+    # Import-time garbage is collected first, then the collector stays off
+    # while the model and indexes load so no freed holes are left in pages
+    # the workers will share.
+    gc.collect()
+    gc.disable()
+    preload()
+    sock = _listen(host, port)
+    # Everything loaded so far is moved to a generation the collector never
+    # scans, so workers do not write GC bookkeeping into (and copy) those
+    # pages.
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def stop(_signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        children[_spawn(sock, log_level)] = time.monotonic()
+    print(f"Serving on http://{host}:{port} with {workers} workers (pid {os.getpid()})")
+
+    # Workers that die are replaced until the master is asked to stop.
+    while children:
+        try:
+            pid, _status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        if time.monotonic() - started < RESPAWN_DELAY:
+            time.sleep(RESPAWN_DELAY)
+        children[_spawn(sock, log_level)] = time.monotonic()
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve web_app from forked workers sharing preloaded state."
+    )
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.log_level)
+    sys.exit(0)
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+_executors = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for executor in _executors:
+        executor._reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class ExecutorSaturated(RuntimeError):
+    pass
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers, queue_depth, timeout=None, use_processes=False):
+        self.max_workers = max_workers
+        self.capacity = max_workers + queue_depth
+        self.timeout = timeout
+        self.use_processes = use_processes
+        # Built on first use, so an executor created before a fork gives each
+        # process its own pool instead of one whose workers live elsewhere.
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        _executors.add(self)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.use_processes:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="pipeline"
+                    )
+            return self._pool
+
+    def _reset_after_fork(self):
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.capacity:
+                return False
+            self._pending += 1
+            return True
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func, *args, **kwargs):
+        # A slot is held until the work actually finishes, not until the caller
+        # gives up, so timed-out jobs still count against the queue depth.
+        if not self._acquire():
+            raise ExecutorSaturated(f"{self._pending} requests already pending")
+        try:
+            future = self._get_pool().submit(func, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+MISSING = object()
+
+# Every hit and write on a shared SQLite cache would otherwise take the file's
+# write lock, so access times are only refreshed once they are this stale,
+# the size is checked every EVICT_INTERVAL writes, and a lock held longer
+# than BUSY_TIMEOUT is treated as a miss.
+TOUCH_INTERVAL = 60.0
+EVICT_INTERVAL = 64
+BUSY_TIMEOUT = 0.5
+
+_sqlite_caches = weakref.WeakSet()
+# A connection must not be closed in a forked child either: that would drop
+# the parent's locks on the file. Inherited handles are kept here instead.
+_inherited = []
+
+
+def _reset_after_fork():
+    for cache in _sqlite_caches:
+        cache._reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class LRUCache:
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= now):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(entry[0])
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        payload = json.dumps(value)
+        with self._lock:
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SqliteCache:
+    def __init__(self, path, max_size, ttl=None, table="cache"):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._connection = None
+        self._sets = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Opened on first use, so a cache created before a fork gives each
+        # process its own connection rather than one shared SQLite handle.
+        _sqlite_caches.add(self)
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)"
+            )
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed "
+                f"ON {self.table} (accessed_at)"
+            )
+            self._connection = connection
+        return self._connection
+
+    def _reset_after_fork(self):
+        if self._connection is not None:
+            _inherited.append(self._connection)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            # The file is shared with other workers; a busy or locked database
+            # costs a miss, or a skipped access time, rather than the request.
+            try:
+                row = self._connect().execute(
+                    f"SELECT value, expires_at, accessed_at FROM {self.table} "
+                    "WHERE key = ?",
+                    (key,),
+                ).fetchone()
+            except sqlite3.OperationalError:
+                row = None
+            if row is None or (row[1] is not None and row[1] <= now):
+                self.misses += 1
+                return MISSING
+            if now - row[2] >= TOUCH_INTERVAL:
+                try:
+                    self._connection.execute(
+                        f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                        (now, key),
+                    )
+                except sqlite3.OperationalError:
+                    pass
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        payload = json.dumps(value)
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    f"INSERT OR REPLACE INTO {self.table} "
+                    "(key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, payload, expires_at, now),
+                )
+                self._sets += 1
+                if self._sets % EVICT_INTERVAL:
+                    return
+                excess = self._size() - self.max_size
+                if excess > 0:
+                    connection.execute(
+                        f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM "
+                        f"{self.table} ORDER BY accessed_at LIMIT ?)",
+                        (excess,),
+                    )
+                    self.evictions += excess
+            except sqlite3.OperationalError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute(f"DELETE FROM {self.table}")
+
+    def _size(self):
+        return self._connect().execute(
+            f"SELECT COUNT(*) FROM {self.table}"
+        ).fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._size()
+
+    def stats(self):
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def create_cache(max_size, ttl=None, path=None, table="cache"):
+    if path:
+        return SqliteCache(path, max_size, ttl=ttl, table=table)
+    return LRUCache(max_size, ttl=ttl)
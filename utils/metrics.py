@@ -0,0 +1,175 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "semparse"
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = f"{PREFIX}_{name}_total"
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_label_text(labels)} {value}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def samples(self):
+        with self._lock:
+            series = {
+                key: (list(counts), total, value_sum)
+                for key, (counts, total, value_sum) in self._series.items()
+            }
+        lines = []
+        for labels, (counts, total, value_sum) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_label_text(labels, [('le', bound)])} "
+                    f"{cumulative}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_label_text(labels, [('le', '+Inf')])} {total}"
+            )
+            lines.append(f"{self.name}_sum{_label_text(labels)} {value_sum}")
+            lines.append(f"{self.name}_count{_label_text(labels)} {total}")
+        return lines
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name = f"{PREFIX}_{name}"
+        self.help_text = help_text
+        self.read = read
+
+    def samples(self):
+        return [f"{self.name} {self.read()}"]
+
+
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent in each pipeline stage.")
+COUNTERS = {
+    "rows_scanned": Counter(
+        "rows_scanned", "Rows read from storage (partition sizes for SQL scans)."
+    ),
+    "rows_returned": Counter("rows_returned", "Rows or scalar answers returned."),
+    "partitions_touched": Counter("partitions_touched", "Year partitions queried."),
+    "cache_hits": Counter("cache_hits", "Plan and result cache hits."),
+    "cache_misses": Counter("cache_misses", "Plan and result cache misses."),
+}
+METRICS = [STAGE_SECONDS, *COUNTERS.values()]
+
+
+@contextmanager
+def trace(current=None):
+    # Collects the stages and counters of one request on top of the
+    # process-wide metrics; pass an earlier trace to keep adding to it.
+    if current is None:
+        current = {"stages": {}, "counters": {}}
+    token = _trace.set(current)
+    try:
+        yield current
+    finally:
+        _trace.reset(token)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        current = _trace.get()
+        if current is not None:
+            stages = current["stages"]
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+
+def count(name, amount=1, **labels):
+    COUNTERS[name].inc(amount, **labels)
+    current = _trace.get()
+    if current is not None:
+        key = "_".join([*(str(value) for value in labels.values()), name])
+        counters = current["counters"]
+        counters[key] = counters.get(key, 0) + amount
+
+
+def register_gauge(name, help_text, read):
+    # Gauges are read when /metrics is rendered, so the value is always current.
+    METRICS.append(Gauge(name, help_text, read))
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
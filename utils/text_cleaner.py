@@ -1,2 +1,6 @@
 def clean(text: str) -> str:
-    return text.lower().strip()
\ No newline at end of file
+    return text.lower().strip()
+
+
+def normalize(text: str) -> str:
+    return " ".join(clean(text).split())
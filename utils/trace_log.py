@@ -0,0 +1,73 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+# Parse trees are logged at DEBUG on this logger. Set PARSE_TREE_LOG=1 (or
+# lower the logger's level) to enable them; otherwise nothing is built.
+PARSE_TREE_LOG = os.environ.get("PARSE_TREE_LOG", "") == "1"
+
+logger = logging.getLogger("semparse.parse_tree")
+if PARSE_TREE_LOG:
+    logger.setLevel(logging.DEBUG)
+
+_listener = None
+_lock = threading.Lock()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The stock handler formats the message on the calling thread; records
+    # stay in-process here, so formatting is left to the listener thread.
+    def prepare(self, record):
+        return record
+
+
+def _start():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        records = queue.SimpleQueue()
+        output = logging.StreamHandler()
+        output.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(_QueueHandler(records))
+        logger.propagate = False
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def _reset_after_fork():
+    # The listener thread does not survive a fork; forked workers start
+    # their own on first use.
+    global _listener
+    for handler in list(logger.handlers):
+        if isinstance(handler, _QueueHandler):
+            logger.removeHandler(handler)
+    _listener = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def enabled():
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+class _TreeMessage:
+    # Serialized only when the listener writes the record.
+    def __init__(self, question, tree):
+        self.question = question
+        self.tree = tree
+
+    def __str__(self):
+        return json.dumps({"question": self.question, "parse_tree": self.tree})
+
+
+def log_tree(question, tree):
+    if _listener is None:
+        _start()
+    logger.debug(_TreeMessage(question, tree))
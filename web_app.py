@@ -1,10 +1,70 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-
-from engine import analyze
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+
+from engine import analyze, analyze_many, plan_question, warm_up
+from execution.connection_pool import close_all
+from execution.data_loader import COLUMNS, ensure_bootstrapped
+from execution.executor import stream_rows
 from response.formatter import format
-
-app = FastAPI()
+from utils import metrics
+from utils.bounded_executor import BoundedExecutor, ExecutorSaturated
+
+ASK_WORKERS = int(os.environ.get("ASK_WORKERS", "4"))
+ASK_QUEUE_DEPTH = int(os.environ.get("ASK_QUEUE_DEPTH", "16"))
+ASK_TIMEOUT_SECONDS = float(os.environ.get("ASK_TIMEOUT_SECONDS", "30"))
+ASK_USE_PROCESSES = os.environ.get("ASK_USE_PROCESSES", "") == "1"
+ASK_BATCH_LIMIT = int(os.environ.get("ASK_BATCH_LIMIT", "1000"))
+ASK_PAGE_SIZE = int(os.environ.get("ASK_PAGE_SIZE", "200"))
+ASK_MAX_PAGE_SIZE = int(os.environ.get("ASK_MAX_PAGE_SIZE", "5000"))
+EXPORT_CHUNK_SIZE = 1000
+
+logger = logging.getLogger("semparse.web_app")
+
+pipeline = BoundedExecutor(
+    ASK_WORKERS,
+    ASK_QUEUE_DEPTH,
+    timeout=ASK_TIMEOUT_SECONDS,
+    use_processes=ASK_USE_PROCESSES,
+)
+metrics.register_gauge(
+    "ask_pending",
+    "Requests running or queued on the /ask worker pool.",
+    lambda: pipeline.pending,
+)
+
+
+def _log_warm_up_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error("Warm-up failed", exc_info=error)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    ensure_bootstrapped()
+    # The server takes requests while the model loads; a failed load is
+    # logged here rather than first showing up as a slow or failed question.
+    warming = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    warming.add_done_callback(_log_warm_up_failure)
+    yield
+    pipeline.shutdown()
+    close_all()
+
+
+app = FastAPI(lifespan=lifespan)
 
 INDEX_HTML = """<!doctype html>
 <html lang=\"en\">
@@ -212,6 +272,23 @@ INDEX_HTML = """<!doctype html>
         color: var(--ink-soft);
       }
 
+      .table-actions {
+        display: flex;
+        gap: 12px;
+        align-items: center;
+        margin-top: 12px;
+      }
+
+      .table-actions button {
+        padding: 8px 16px;
+        font-size: 0.9rem;
+      }
+
+      .table-actions a {
+        color: var(--ink-soft);
+        font-size: 0.9rem;
+      }
+
       .chip {
         display: inline-block;
         margin-top: 10px;
@@ -266,7 +343,7 @@ INDEX_HTML = """<!doctype html>
           <input id=\"question-input\" type=\"text\" placeholder=\"Show revenue in 2024\" autocomplete=\"off\" />
           <button type=\"submit\">Parse and Answer</button>
         </form>
-        <div class=\"hint\">Parse trees are printed to the terminal where FastAPI is running.</div>
+        <div class=\"hint\">Send \"show_tree\": true to /ask to get the parse tree back.</div>
         <div class=\"chip\">Try: list sales orders in 2023</div>
         <div id=\"result\" class=\"result\"></div>
       </section>
@@ -277,13 +354,11 @@ INDEX_HTML = """<!doctype html>
       const input = document.getElementById("question-input");
       const result = document.getElementById("result");
 
-      const buildTable = (rows) => {
-        if (!rows.length) {
-          return "";
-        }
-        const columns = Object.keys(rows[0]);
-        const header = columns.map((col) => `<th>${col}</th>`).join("");
-        const body = rows
+      let currentQuestion = "";
+      let nextAfter = null;
+
+      const buildRows = (columns, rows) =>
+        rows
           .map(
             (row) =>
               `<tr>${columns
@@ -291,16 +366,63 @@ INDEX_HTML = """<!doctype html>
                 .join("")}</tr>`
           )
           .join("");
+
+      const buildTable = (rows) => {
+        if (!rows.length) {
+          return "";
+        }
+        const columns = Object.keys(rows[0]);
+        const header = columns.map((col) => `<th>${col}</th>`).join("");
+        const exportUrl = `/export?format=csv&question=${encodeURIComponent(currentQuestion)}`;
         return `
           <div class=\"table-wrap\">
             <table>
               <thead><tr>${header}</tr></thead>
-              <tbody>${body}</tbody>
+              <tbody>${buildRows(columns, rows)}</tbody>
             </table>
           </div>
+          <div class=\"table-actions\">
+            <button id=\"load-more\" type=\"button\" ${nextAfter === null ? "hidden" : ""}>Load more</button>
+            <a href=\"${exportUrl}\">Download all rows as CSV</a>
+          </div>
         `;
       };
 
+      const askPage = async (question, after) => {
+        const response = await fetch("/ask", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify(after === null ? { question } : { question, after })
+        });
+        const payload = await response.json();
+        if (!response.ok) {
+          throw new Error(payload.answer || "Request failed.");
+        }
+        nextAfter = payload.next_after ?? null;
+        return payload;
+      };
+
+      result.addEventListener("click", async (event) => {
+        if (event.target.id !== "load-more" || nextAfter === null) {
+          return;
+        }
+        const button = event.target;
+        button.disabled = true;
+        try {
+          const payload = await askPage(currentQuestion, nextAfter);
+          const rows = Array.isArray(payload.rows) ? payload.rows : [];
+          const tbody = result.querySelector("tbody");
+          if (rows.length && tbody) {
+            tbody.insertAdjacentHTML("beforeend", buildRows(Object.keys(rows[0]), rows));
+          }
+          button.hidden = nextAfter === null;
+        } catch (error) {
+          button.textContent = error.message;
+        } finally {
+          button.disabled = false;
+        }
+      });
+
       form.addEventListener("submit", async (event) => {
         event.preventDefault();
         const question = input.value.trim();
@@ -316,17 +438,8 @@ INDEX_HTML = """<!doctype html>
         result.classList.add("loading");
 
         try {
-          const response = await fetch("/ask", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ question })
-          });
-
-          const payload = await response.json();
-
-          if (!response.ok) {
-            throw new Error(payload.answer || "Request failed.");
-          }
+          currentQuestion = question;
+          const payload = await askPage(question, null);
 
           const rows = Array.isArray(payload.rows) ? payload.rows : [];
           const tableMarkup = rows.length ? buildTable(rows) : "";
@@ -354,14 +467,175 @@ def index():
     return INDEX_HTML
 
 
+def _busy_response():
+    return JSONResponse(
+        {"answer": "The server is busy. Please try again shortly."},
+        status_code=429,
+        headers={"Retry-After": "1"},
+    )
+
+
+def _timeout_response():
+    return JSONResponse(
+        {"answer": "The question took too long to answer."}, status_code=504
+    )
+
+
+def _page_args(payload):
+    limit = payload.get("limit") or ASK_PAGE_SIZE
+    after = payload.get("after")
+    limit = max(1, min(int(limit), ASK_MAX_PAGE_SIZE))
+    return limit, (int(after) if after is not None else None)
+
+
+def _answer_payload(analysis):
+    if analysis["intent"] != "LIST":
+        with metrics.stage("format"):
+            answer = format(analysis["metric"], analysis["result"], analysis["filters"])
+        return {"answer": answer, "rows": None}
+    rows = analysis["result"] or []
+    next_after = rows[-1]["order_id"] if analysis.get("more") else None
+    with metrics.stage("format"):
+        answer = format(
+            analysis["metric"],
+            analysis["result"],
+            analysis["filters"],
+            total=analysis.get("total"),
+            more=next_after is not None,
+        )
+    return {"answer": answer, "rows": rows, "next_after": next_after}
+
+
+def _ndjson_chunks(rows):
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row))
+        if len(buffer) >= EXPORT_CHUNK_SIZE:
+            yield "\n".join(buffer) + "\n"
+            buffer = []
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
 @app.post("/ask")
 async def ask_question(request: Request):
     payload = await request.json()
     question = (payload.get("question") or "").strip()
     if not question:
         return JSONResponse({"answer": "Please enter a question."}, status_code=400)
-
-    analysis = analyze(question, show_tree=True)
-    answer = format(analysis["metric"], analysis["result"], analysis["filters"])
-    rows = analysis["result"] if analysis["intent"] == "LIST" else None
-    return {"answer": answer, "rows": rows}
+    try:
+        limit, after = _page_args(payload)
+    except (TypeError, ValueError):
+        return JSONResponse(
+            {"answer": "limit and after must be integers."}, status_code=400
+        )
+
+    show_tree = bool(payload.get("show_tree"))
+    debug = bool(payload.get("debug"))
+
+    try:
+        analysis = await pipeline.run(
+            analyze,
+            question,
+            show_tree=show_tree,
+            limit=limit,
+            after=after,
+            debug=debug,
+        )
+    except ExecutorSaturated:
+        return _busy_response()
+    except asyncio.TimeoutError:
+        return _timeout_response()
+    if not debug:
+        answer = _answer_payload(analysis)
+    else:
+        with metrics.trace(analysis["metrics"]) as current:
+            answer = _answer_payload(analysis)
+        answer["metrics"] = current
+    if show_tree:
+        answer["parse_tree"] = analysis["parse_tree"]
+    return answer
+
+
+@app.post("/ask/batch")
+async def ask_batch(request: Request):
+    payload = await request.json()
+    questions = payload.get("questions")
+    if not isinstance(questions, list) or not all(
+        isinstance(item, str) for item in questions
+    ):
+        return JSONResponse(
+            {"answer": "questions must be a list of strings."}, status_code=400
+        )
+    questions = [item.strip() for item in questions]
+    if not questions or not all(questions):
+        return JSONResponse(
+            {"answer": "Please provide a non-empty list of questions."},
+            status_code=400,
+        )
+    if len(questions) > ASK_BATCH_LIMIT:
+        return JSONResponse(
+            {"answer": f"At most {ASK_BATCH_LIMIT} questions per batch."},
+            status_code=413,
+        )
+
+    try:
+        analyses = await pipeline.run(analyze_many, questions, limit=ASK_PAGE_SIZE)
+    except ExecutorSaturated:
+        return _busy_response()
+    except asyncio.TimeoutError:
+        return _timeout_response()
+    answers = []
+    for analysis in analyses:
+        answer = _answer_payload(analysis)
+        answer["question"] = analysis["question"]
+        answers.append(answer)
+    return {"answers": answers}
+
+
+@app.get("/export")
+async def export_rows(
+    question: str, export_format: str = Query("ndjson", alias="format")
+):
+    question = question.strip()
+    if not question or export_format not in {"ndjson", "csv"}:
+        return JSONResponse(
+            {"answer": "Provide a question and format=ndjson or format=csv."},
+            status_code=400,
+        )
+
+    try:
+        logical_plan = await pipeline.run(plan_question, question)
+    except ExecutorSaturated:
+        return _busy_response()
+    except asyncio.TimeoutError:
+        return _timeout_response()
+
+    rows = stream_rows(logical_plan, chunk_size=EXPORT_CHUNK_SIZE)
+    if export_format == "csv":
+        return StreamingResponse(
+            _csv_chunks(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="export.csv"'},
+        )
+    return StreamingResponse(_ndjson_chunks(rows), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )